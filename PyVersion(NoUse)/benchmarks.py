@@ -0,0 +1,327 @@
+# 性能基准：地图生成、玩家移动、子弹移动（含墙3反弹）、爆炸染色、子弹与玩家/防护罩的结算（两人和16人），
+# 流场的新建和爆炸变色后的增量修复，视线查询（命中缓存）和反弹射击搜索，
+# 以及用dummy视频驱动离屏渲染一整帧。按子弹数量和地图尺寸（相对默认40x30格子的倍数）组合运行，
+# 结果输出为JSON或CSV，便于比较不同提交之间的变化。
+# 例：python benchmarks.py --bullets 10 100 1000 5000 --arena 1 2 4 --out bench.json
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import random
+import time
+import types
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # 离屏渲染，不需要窗口
+
+from game_core import (SCREEN_WIDTH, SCREEN_HEIGHT, WALL_SIZE, BLUE, RED, WHITE, LIGHT_BLUE, LIGHT_RED, OWN_PAINT,
+                       Match, Player, Bullet, generate_grid)
+from flow_field import FlowField, FlowFieldCache
+from line_of_sight import SightCache
+
+BASE_COLS = SCREEN_WIDTH // WALL_SIZE
+BASE_ROWS = SCREEN_HEIGHT // WALL_SIZE
+
+
+def arena_grid(arena, seed=0):
+    # arena倍的地图（长宽各乘arena），默认尺寸用兼容模式生成
+    return generate_grid(seed, BASE_COLS * arena, BASE_ROWS * arena, compatible=arena == 1)
+
+
+def free_points(grid, count, rng):
+    # 在没有墙的格子中心附近随机取点
+    empty = [index for index, wall_type in enumerate(grid.types) if wall_type == 0]
+    points = []
+    for _ in range(count):
+        row, col = divmod(rng.choice(empty), grid.cols)
+        points.append((col * WALL_SIZE + rng.uniform(1, WALL_SIZE - 1), row * WALL_SIZE + rng.uniform(1, WALL_SIZE - 1)))
+    return points
+
+
+def timed(func, repeat):
+    # 运行repeat次，返回最快一次的秒数；func返回本次完成的操作数
+    best = None
+    ops = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, ops
+
+
+def bench_generate_map(arena, bullets, repeat):
+    seeds = iter(range(10 ** 6))
+    return timed(lambda: arena_grid(arena, next(seeds)) and 1, repeat)
+
+
+def bench_new_match(arena, bullets, repeat):
+    # 用现成的地图开局（MapPool重新开局时的开销），墙只在访问match.walls时才创建句柄
+    grid = arena_grid(arena)
+    return timed(lambda: [Match(grid=grid) for _ in range(100)] and 100, repeat)
+
+
+def bench_player_move(arena, bullets, repeat):
+    grid = arena_grid(arena)
+    rng = random.Random(1)
+    players = []
+    for x, y in free_points(grid, 100, rng):
+        player = Player(x, y, BLUE)
+        player.push_back(rng.uniform(0, 4), rng.uniform(-math.pi, math.pi))
+        players.append(player)
+
+    def run():
+        for _ in range(100):
+            for player in players:
+                player.move(grid)
+        return 100 * len(players)
+    return timed(run, repeat)
+
+
+def make_bullets(grid, count, seed):
+    rng = random.Random(seed)
+    return [Bullet(x, y, rng.uniform(-math.pi, math.pi), rng.choice((BLUE, RED)), None)
+            for x, y in free_points(grid, count, rng)]
+
+
+def bench_bullet_move(arena, bullets, repeat):
+    # 一个tick内移动所有子弹；撞墙的子弹会爆炸染色，途经墙3会反弹
+    grid = arena_grid(arena)
+    seeds = iter(range(10 ** 6))
+
+    def run():
+        moving = make_bullets(grid, bullets, next(seeds))
+        start = time.perf_counter()
+        for bullet in moving:
+            bullet.move(grid)
+        return time.perf_counter() - start
+    # 子弹的创建不计入时间
+    return min(run() for _ in range(repeat)), bullets
+
+
+def bench_bullet_array(arena, bullets, repeat):
+    # 向量化子弹系统的一个tick（需要NumPy）
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return None
+    grid = arena_grid(arena)
+    seeds = iter(range(10 ** 6))
+
+    def run():
+        match = Match(grid=grid, vectorized=True)
+        rng = random.Random(next(seeds))
+        for x, y in free_points(match.grid, bullets, rng):
+            match.bullets.spawn(x, y, rng.uniform(-math.pi, math.pi), rng.randrange(2), 0, rng.choice((2, 3)))
+        match.tick = 100
+        start = time.perf_counter()
+        match.bullets.step(match)
+        return time.perf_counter() - start
+    return min(run() for _ in range(repeat)), bullets
+
+
+def bench_explode(arena, bullets, repeat):
+    grid = arena_grid(arena)
+    rng = random.Random(2)
+    points = free_points(grid, max(bullets, 100), rng)
+    colors = [rng.choice(((255, 100, 100), (100, 100, 255))) for _ in points]
+
+    def run():
+        for (x, y), color in zip(points, colors):
+            grid.paint_blast(x, y, color)
+        return len(points)
+    return timed(run, repeat)
+
+
+def bench_resolve_hit(arena, bullets, repeat):
+    # 子弹分布在两名玩家周围，一半时间开着防护罩
+    match = Match(grid=arena_grid(arena))
+    rng = random.Random(3)
+    points = []
+    for _ in range(bullets):
+        player = rng.choice(match.players)
+        distance = rng.uniform(0, 60)
+        angle = rng.uniform(-math.pi, math.pi)
+        points.append((player.x + math.cos(angle) * distance, player.y + math.sin(angle) * distance,
+                       rng.choice(match.players)))
+
+    def run():
+        for i, (x, y, owner) in enumerate(points):
+            if i % 2 == 0:
+                for player in match.players:
+                    player.shield_cooldown = 0
+                    player.activate_shield()
+            match.game_over = False
+            for player in match.players:
+                player.health = 100
+            match.resolve_hit(x, y, owner)
+        return len(points)
+    return timed(run, repeat)
+
+
+def bench_crowd_hits(arena, bullets, repeat):
+    # 16名玩家分散在地图上，子弹随机分布：每颗子弹只查空间哈希中自己所在的桶
+    match = Match(seed=0, players=16, arena=(BASE_COLS * arena, BASE_ROWS * arena))
+    rng = random.Random(6)
+    points = [(x, y, rng.choice(match.players)) for x, y in free_points(match.grid, bullets, rng)]
+
+    def run():
+        # 血量给足，整轮都不会有人阵亡
+        for player in match.players:
+            player.health = 10 ** 9
+        for x, y, owner in points:
+            match.resolve_hit(x, y, owner)
+        return len(points)
+    return timed(run, repeat)
+
+
+def bench_flow_build(arena, bullets, repeat):
+    # 从地图一角到另一角的流场，整张地图BFS一遍
+    grid = arena_grid(arena)
+    target = grid.nearest_open(0)
+    paint = OWN_PAINT[RED]
+    return timed(lambda: FlowField(grid, paint, target) and 1, repeat)
+
+
+def bench_flow_repair(arena, bullets, repeat):
+    # 8个流场（两种颜色 x 4个目标），每次爆炸变色后同步一次，只修复受影响的部分
+    grid = arena_grid(arena)
+    rng = random.Random(7)
+    points = free_points(grid, max(bullets, 100), rng)
+    colors = [rng.choice((LIGHT_RED, LIGHT_BLUE)) for _ in points]
+    cache = FlowFieldCache(grid)
+    for target in free_points(grid, 4, rng):
+        index = grid.cell_index(*target)
+        cache.field(OWN_PAINT[RED], index, exact=True)
+        cache.field(OWN_PAINT[BLUE], index, exact=True)
+
+    # sync只用到match的tick和recolored
+    match = types.SimpleNamespace(tick=0, recolored=())
+
+    def run():
+        for (x, y), color in zip(points, colors):
+            match.recolored = grid.paint_blast(x, y, color)
+            match.tick += 1
+            cache.sync(match)
+        return len(points)
+    return timed(run, repeat)
+
+
+def bench_sight_query(arena, bullets, repeat):
+    # 1000对格子之间的视线，先查一遍填满缓存，计时的是命中缓存的查询
+    grid = arena_grid(arena)
+    rng = random.Random(8)
+    cells = [grid.cell_index(x, y) for x, y in free_points(grid, 2000, rng)]
+    pairs = list(zip(cells[::2], cells[1::2]))
+    cache = SightCache(grid)
+    paint = OWN_PAINT[RED]
+    for source, target in pairs:
+        cache.visible(source, target, paint)
+    return timed(lambda: [cache.visible(source, target, paint) for source, target in pairs] and len(pairs), repeat)
+
+
+def bench_bounce_search(arena, bullets, repeat):
+    # 没有缓存时搜索一对格子之间的反弹射击（一整圈ANGLE_STEPS个角度，最多反弹3次）
+    grid = arena_grid(arena)
+    rng = random.Random(9)
+    cells = [grid.cell_index(x, y) for x, y in free_points(grid, 20, rng)]
+    paint = OWN_PAINT[RED]
+
+    def run():
+        cache = SightCache(grid)
+        for source, target in zip(cells[::2], cells[1::2]):
+            cache.bounce_shots(source, target, paint, 20)
+        return len(cells) // 2
+    return timed(run, repeat)
+
+
+def bench_render_frame(arena, bullets, repeat):
+    # 离屏渲染一整帧：背景、effect_surface、墙体层、玩家、子弹和文字
+    import pygame
+    from render import SpriteCache, WallLayer, TextCache, draw_bullet, FONT_SIZE
+
+    pygame.init()
+    grid = arena_grid(arena)
+    width, height = grid.cols * WALL_SIZE, grid.rows * WALL_SIZE
+    screen = pygame.display.set_mode((width, height))
+    effect_surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    wall_layer = WallLayer(grid)
+    sprites = SpriteCache()
+    texts = TextCache()
+    players = [Player(x, y, color) for (x, y), color in zip(free_points(grid, 2, random.Random(4)), (BLUE, RED))]
+    moving = make_bullets(grid, bullets, 5)
+
+    def run():
+        for _ in range(10):
+            screen.fill(WHITE)
+            screen.blit(effect_surface, (0, 0))
+            wall_layer.draw(screen)
+            for player in players:
+                sprites.draw_player(screen, player)
+            for bullet in moving:
+                draw_bullet(screen, bullet)
+            screen.blit(texts.render("P1 Health: 100", FONT_SIZE, (0, 0, 0)), (10, 10))
+            pygame.display.flip()
+        return 10
+    return timed(run, repeat)
+
+
+BENCHMARKS = {
+    "generate_map": (bench_generate_map, False),  # (函数, 是否与子弹数量有关)
+    "new_match": (bench_new_match, False),
+    "player_move": (bench_player_move, False),
+    "bullet_move": (bench_bullet_move, True),
+    "bullet_array": (bench_bullet_array, True),
+    "explode": (bench_explode, True),
+    "resolve_hit": (bench_resolve_hit, True),
+    "crowd_hits": (bench_crowd_hits, True),
+    "flow_build": (bench_flow_build, False),
+    "flow_repair": (bench_flow_repair, True),
+    "sight_query": (bench_sight_query, False),
+    "bounce_search": (bench_bounce_search, False),
+    "render_frame": (bench_render_frame, True),
+}
+
+
+def run_benchmarks(names, bullet_counts, arenas, repeat):
+    results = []
+    for name in names:
+        func, per_bullet = BENCHMARKS[name]
+        for arena in arenas:
+            for bullets in (bullet_counts if per_bullet else [0]):
+                result = func(arena, bullets, repeat)
+                if result is None:
+                    continue
+                seconds, ops = result
+                results.append({"benchmark": name, "arena": arena, "bullets": bullets, "ops": ops,
+                                "seconds": round(seconds, 6), "us_per_op": round(seconds / ops * 1e6, 3)})
+                print(f"{name:14} arena {arena:2} bullets {bullets:5}  {seconds * 1000:9.3f} ms  "
+                      f"{seconds / ops * 1e6:9.3f} us/op")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="性能基准")
+    parser.add_argument("--bullets", type=int, nargs="+", default=[10, 100, 1000, 5000], help="子弹数量")
+    parser.add_argument("--arena", type=int, nargs="+", default=[1, 4], help="地图尺寸倍数（长宽各乘以该值）")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS), help="只运行这些基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取最快一次")
+    parser.add_argument("--out", help="结果文件，.csv或.json")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.bullets, args.arena, args.repeat)
+    if args.out and args.out.endswith(".csv"):
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    elif args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
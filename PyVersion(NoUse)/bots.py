@@ -0,0 +1,222 @@
+# 电脑玩家：每个tick在match.step()之前调用act，像键盘输入一样转向、射击和开关防护罩。
+# 所有操作都通过send(match, 玩家下标, 指令, 参数)发出，默认直接执行；
+# 界面中传入recorder.send，电脑玩家的操作就和人的输入一样被录像记录。
+# 随机性都来自各自的random.Random(seed)，同样的种子得到同样的操作
+import math
+import random
+
+import game_core
+from game_core import OWN_PAINT, WALL_SIZE
+from flow_field import FlowFieldCache
+from line_of_sight import SightCache
+from replay import apply_input, snap_angle, FIRE, SHIELD_ON, SHIELD_OFF, TURN_LEFT, TURN_RIGHT, SET_ANGLE
+
+
+def enemy_bullets(match, player):
+    # 返回其他队伍射出的子弹的(x, y, angle)
+    if match.vectorized:
+        bullets = match.bullets
+        teams = [p.team for p in match.players]
+        return [(float(bullets.x[i]), float(bullets.y[i]), float(bullets.angle[i]))
+                for i in range(bullets.count) if teams[bullets.owner[i]] != player.team]
+    return [(bullet.x, bullet.y, bullet.angle) for bullet in match.bullets if bullet.owner.team != player.team]
+
+
+def nearest_enemy(match, player):
+    opponents = [p for p in match.players if p.team != player.team and p.is_alive()]
+    if not opponents:
+        return None
+    return min(opponents, key=lambda p: math.hypot(p.x - player.x, p.y - player.y))
+
+
+def turn_towards(match, player, target_angle, send=apply_input):
+    # 按键盘的转向速度朝目标角度转动，返回剩余的角度差
+    diff = (target_angle - player.angle + math.pi) % (2 * math.pi) - math.pi
+    index = match.players.index(player)
+    if diff > game_core.ROTATE_SPEED:
+        send(match, index, TURN_RIGHT)
+    elif diff < -game_core.ROTATE_SPEED:
+        send(match, index, TURN_LEFT)
+    elif player.angle != snap_angle(target_angle):
+        send(match, index, SET_ANGLE, target_angle)
+    return diff
+
+
+def guard(match, player, shield_ticks, send=apply_input):
+    # 有敌方子弹正朝自己飞来且预计shield_ticks个tick内打到时按住防护罩，否则松开；返回是否危险
+    danger = False
+    reach = player.shield_radius + game_core.BULLET_SPEED * shield_ticks
+    for x, y, angle in enemy_bullets(match, player):
+        dx = player.x - x
+        dy = player.y - y
+        if dx * dx + dy * dy < reach * reach and dx * math.cos(angle) + dy * math.sin(angle) > 0:
+            danger = True
+            break
+    index = match.players.index(player)
+    if danger:
+        if not player.shield_active and player.shield_cooldown <= 0:
+            send(match, index, SHIELD_ON)
+    elif player.shield_active:
+        send(match, index, SHIELD_OFF)
+    return danger
+
+
+# 什么都不做，用作靶子
+class IdleBot:
+    def __init__(self, seed=None):
+        pass
+
+    def act(self, match, player, send=apply_input):
+        pass
+
+
+# 随机转向、随机射击
+class RandomBot:
+    def __init__(self, seed=None, fire_chance=0.05):
+        self.rng = random.Random(seed)
+        self.fire_chance = fire_chance
+        self.turn = 0
+
+    def act(self, match, player, send=apply_input):
+        if not player.is_alive():
+            return
+        index = match.players.index(player)
+        if self.rng.random() < 0.1:
+            self.turn = self.rng.choice((-1, 0, 1))
+        if self.turn:
+            send(match, index, TURN_RIGHT if self.turn > 0 else TURN_LEFT)
+        if self.rng.random() < self.fire_chance:
+            send(match, index, FIRE)
+
+
+def lead_angle(player, target):
+    # 朝目标开火的方向：按子弹飞到目标的时间预判目标的位置，再迭代一次修正飞行时间。
+    # 目标的速度每tick乘以friction衰减，飞行t个tick的位移是v * (1 - f^t) / (1 - f)
+    x = target.x
+    y = target.y
+    for _ in range(2):
+        ticks = math.hypot(x - player.x, y - player.y) / game_core.BULLET_SPEED
+        drift = (1 - target.friction ** ticks) / (1 - target.friction)
+        x = target.x + target.speed_x * drift
+        y = target.y + target.speed_y * drift
+    return math.atan2(y - player.y, x - player.x)
+
+
+# 瞄准最近的敌方玩家射击（预判目标的移动），敌方子弹快要打到时开防护罩
+class AimBot:
+    def __init__(self, seed=None, fire_interval=2, aim_error=0.1, shield_ticks=3, max_hold=30):
+        self.rng = random.Random(seed)
+        self.fire_interval = fire_interval  # 两次射击之间至少间隔的tick数
+        self.aim_error = aim_error  # 瞄准时的随机偏差（弧度）
+        self.shield_ticks = shield_ticks  # 子弹预计几个tick内打到自己时开防护罩
+        self.max_hold = max_hold  # 危险时最多连续停火的tick数
+        self.next_fire = 0
+        self.offset = 0.0
+        self.danger_since = None  # 这一段危险开始的tick
+
+    def hold_fire(self, match, danger):
+        # 危险时停火，等防护罩挡下子弹；连续危险超过max_hold个tick后照常射击，不会一直被压制
+        if not danger:
+            self.danger_since = None
+            return False
+        if self.danger_since is None:
+            self.danger_since = match.tick
+        return match.tick - self.danger_since < self.max_hold
+
+    def act(self, match, player, send=apply_input):
+        if not player.is_alive():
+            return
+        target = nearest_enemy(match, player)
+        if target is None:
+            return
+        self.shoot(match, player, target, send, self.hold_fire(match, guard(match, player, self.shield_ticks, send)))
+
+    def shoot(self, match, player, target, send, hold, angle=None):
+        # 子弹从三角形尾部射出，所以瞄准时要背对目标；angle为算好的反弹射击角度时不加随机偏差
+        if match.tick >= self.next_fire:
+            self.offset = self.rng.uniform(-self.aim_error, self.aim_error)
+        if angle is None:
+            aim = lead_angle(player, target) + math.pi + self.offset
+        else:
+            aim = angle + math.pi
+        diff = turn_towards(match, player, aim, send)
+        if abs(diff) <= game_core.ROTATE_SPEED and match.tick >= self.next_fire and not hold:
+            if send(match, match.players.index(player), FIRE) is not None:
+                self.next_fire = match.tick + self.fire_interval
+
+
+# 穿过迷宫接近最近的敌人：能直接打到目标时像AimBot一样射击，能经墙3反弹打到时按line_of_sight算出的角度射击，
+# 否则沿流场走向目标所在的块，到了锚点后改用以目标格子为终点的流场。
+# 中间只隔着别的颜色的墙2时，只有流场走不通、或者绕路比染穿这些墙更远时才朝目标射击，把墙2染成自己的颜色开路。
+# 玩家只能靠射击的后坐力移动，所以走路就是面朝下一个格子射击，子弹从背后射出。
+# 流场由同一局的电脑玩家共用，只在墙2变色时增量修复，每个tick的开销只是查几个相邻格子
+class NavBot(AimBot):
+    def __init__(self, seed=None, fire_interval=2, aim_error=0.1, shield_ticks=3, max_hold=30, cruise_speed=1.5,
+                 bounces=2, wall_cost=1, commit_ticks=30):
+        super().__init__(seed, fire_interval, aim_error, shield_ticks, max_hold)
+        self.cruise_speed = cruise_speed  # 速度低于它时才再射击加速，避免冲过拐角
+        self.bounces = bounces  # 最多考虑几次反弹的射击，0为不找反弹射击
+        self.wall_cost = wall_cost  # 染穿一格墙2相当于多走几格路
+        self.commit_ticks = commit_ticks  # 决定染墙开路还是绕路后至少坚持的tick数，避免来回转身
+        self.breaching = False  # 当前是否在朝目标射击开路
+        self.decide_tick = 0  # 到这个tick再重新比较开路和绕路
+
+    def act(self, match, player, send=apply_input):
+        if not player.is_alive():
+            return
+        target = nearest_enemy(match, player)
+        if target is None:
+            return
+        hold = self.hold_fire(match, guard(match, player, self.shield_ticks, send))
+        grid = match.grid
+        paint = OWN_PAINT.get(player.color, 0)
+        dx = target.x - player.x
+        dy = target.y - player.y
+        distance = math.hypot(dx, dy)
+        if distance < 1:
+            return
+        sight = SightCache.for_match(match)
+        shot = sight.best_shot(match, player, target, self.bounces)
+        if shot is not None:
+            self.shoot(match, player, target, send, hold, shot[0] if shot[1] else None)
+            return
+        hit = grid.trace(player.x, player.y, dx / distance, dy / distance, distance, paint)
+        if hit is None:
+            self.shoot(match, player, target, send, hold)
+            return
+
+        cache = FlowFieldCache.for_match(match)
+        cache.sync(match)
+        here = grid.cell_index(player.x, player.y)
+        goal = grid.cell_index(target.x, target.y)
+        if here < 0 or goal < 0:
+            return
+        field = cache.field(paint, goal)
+        next_cell = field.next_cell(here)
+        if next_cell is None:
+            field = cache.field(paint, goal, exact=True)
+            next_cell = field.next_cell(here)
+        if hit[2] == 2 and match.tick >= self.decide_tick:
+            # 直线上只有墙2挡着：流场走不通或者绕路比染穿这些墙还远时开路，否则绕路
+            walls = []
+            self.breaching = False
+            if grid.trace(player.x, player.y, dx / distance, dy / distance, distance, 0, walls) is None:
+                cost = distance / WALL_SIZE + self.wall_cost * sum(grid.colors[index] != paint for index in walls)
+                self.breaching = next_cell is None or cost < field.dist[here]
+            self.decide_tick = match.tick + self.commit_ticks
+        if hit[2] == 2 and not self.breaching and sight.best_shot(match, target, player, self.bounces) is not None:
+            # 对方能打到自己时不背对它绕路，立刻回身开路还击
+            self.breaching = True
+            self.decide_tick = match.tick + self.commit_ticks
+        if (hit[2] == 2 and self.breaching) or next_cell is None:
+            self.shoot(match, player, target, send, hold)
+            return
+        x, y = grid.cell_center(next_cell)
+        heading = math.atan2(y - player.y, x - player.x)
+        diff = turn_towards(match, player, heading, send)
+        speed = math.hypot(player.speed_x, player.speed_y)
+        if abs(diff) <= game_core.ROTATE_SPEED and speed < self.cruise_speed and not hold:
+            send(match, match.players.index(player), FIRE)
+
+
+BOTS = {"idle": IdleBot, "random": RandomBot, "aim": AimBot, "nav": NavBot}
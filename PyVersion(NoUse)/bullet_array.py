@@ -0,0 +1,155 @@
+# 向量化子弹系统：子弹按结构数组（struct-of-arrays）保存在NumPy数组中，
+# 移动、查墙、防护罩和玩家命中都按批处理（靠近墙的少数子弹逐个做连续碰撞检测），命中的子弹通过压缩数组移除。
+# 用于成百上千颗子弹同时存在的压力模式；NumPy是可选依赖，只有Match(vectorized=True)才会用到
+try:
+    import numpy as np
+except ImportError:  # 没有NumPy时仍可使用普通的Bullet列表
+    np = None
+
+import game_core
+from game_core import WALL_SIZE, HASH_STRIDE, TRAIL_COLORS, LIGHT_RED, sweep_bullet
+
+
+class BulletArray:
+    # 每颗子弹占用的数组字段
+    FIELDS = ("x", "y", "prev_x", "prev_y", "angle", "vx", "vy", "owner", "paint", "spawn_tick", "serial")
+
+    def __init__(self, capacity=256):
+        if np is None:
+            raise ImportError("BulletArray需要NumPy，请安装numpy或使用Match(vectorized=False)")
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)  # 上一个tick的位置，用于绘制轨迹
+        self.prev_y = np.zeros(capacity)
+        self.angle = np.zeros(capacity)
+        self.vx = np.zeros(capacity)  # 每tick的位移，只在发射和反弹时计算三角函数
+        self.vy = np.zeros(capacity)
+        self.owner = np.zeros(capacity, dtype=np.int16)  # 发射者在match.players中的下标
+        self.paint = np.zeros(capacity, dtype=np.uint8)  # 发射者的染色编号，0表示不受墙2阻挡
+        self.spawn_tick = np.zeros(capacity, dtype=np.int64)  # 发射时的tick
+        self.serial = np.zeros(capacity, dtype=np.int64)  # 子弹编号，压缩数组后保持不变
+        self.next_serial = 0
+        self.bends = {}  # 本tick反弹过的子弹编号 -> 经过的反弹点和终点，用于绘制轨迹
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(len(old) * 2, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, x, y, angle, owner, tick, paint):
+        if self.count == len(self.x):
+            self.grow()
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.set_angle(i, angle)
+        self.owner[i] = owner
+        self.paint[i] = paint
+        self.spawn_tick[i] = tick
+        self.serial[i] = self.next_serial
+        self.next_serial += 1
+        self.count += 1
+        return i
+
+    def set_angle(self, i, angle):
+        self.angle[i] = angle
+        self.vx[i] = np.cos(angle) * game_core.BULLET_SPEED
+        self.vy[i] = np.sin(angle) * game_core.BULLET_SPEED
+
+    def trail_color(self, match, i):
+        return TRAIL_COLORS.get(match.players[self.owner[i]].color, LIGHT_RED)
+
+    def path(self, i):
+        # 第i颗子弹本tick经过的点：上一个tick的位置、反弹点和当前位置
+        return [(self.prev_x[i], self.prev_y[i])] + self.bends.get(int(self.serial[i]), [(self.x[i], self.y[i])])
+
+    def step(self, match):
+        n = self.count
+        self.bends = {}
+        if n == 0:
+            return
+        grid = match.grid
+        types = np.frombuffer(grid.types, dtype=np.uint8)
+        x = self.x[:n]
+        y = self.y[:n]
+        self.prev_x[:n] = x
+        self.prev_y[:n] = y
+
+        # 批量计算起点和终点所在格子
+        new_x = x + self.vx[:n]
+        new_y = y + self.vy[:n]
+        col0 = np.floor_divide(x, WALL_SIZE).astype(np.int64)
+        row0 = np.floor_divide(y, WALL_SIZE).astype(np.int64)
+        col1 = np.floor_divide(new_x, WALL_SIZE).astype(np.int64)
+        row1 = np.floor_divide(new_y, WALL_SIZE).astype(np.int64)
+
+        def cell_types(col, row):
+            inside = (col >= 0) & (col < grid.cols) & (row >= 0) & (row < grid.rows)
+            return np.where(inside, types[np.where(inside, row * grid.cols + col, 0)], 0)
+
+        # 本tick途经的格子是终点格子，斜穿格角时还有两个相邻格子；这些格子都没有墙的子弹直接批量移动，
+        # 其余子弹（可能撞墙、反弹或需要判断墙2颜色）按发射顺序逐个做连续碰撞检测，
+        # 这样前面子弹爆炸的染色能影响同一tick后面的子弹
+        diagonal = (col1 != col0) & (row1 != row0)
+        near_wall = (cell_types(col1, row1) != 0) | \
+            (diagonal & ((cell_types(col1, row0) != 0) | (cell_types(col0, row1) != 0)))
+        far = (np.abs(col1 - col0) > 1) | (np.abs(row1 - row0) > 1)
+        on_edge = (new_x % WALL_SIZE == 0) | (new_y % WALL_SIZE == 0)  # 终点恰好压在格子边界上
+        swept = near_wall | far | on_edge
+        free = ~swept
+        x[free] = new_x[free]
+        y[free] = new_y[free]
+
+        keep = np.ones(n, dtype=bool)
+        paint = self.paint[:n]
+        for i in np.nonzero(swept)[0]:
+            angle = float(self.angle[i])
+            points = []
+            x[i], y[i], new_angle, collision = sweep_bullet(
+                grid, float(x[i]), float(y[i]), angle, game_core.BULLET_SPEED, int(paint[i]), points)
+            if len(points) > 1:
+                self.bends[int(self.serial[i])] = points
+            if new_angle != angle:
+                self.set_angle(i, new_angle)
+            if collision:
+                match.explode(float(x[i]), float(y[i]), self.trail_color(match, i))
+                keep[i] = False
+
+        # 检测子弹与防护罩、玩家的碰撞：批量算出每颗子弹所在的空间哈希桶，
+        # 只有落在有玩家登记的桶里的子弹才按顺序精确结算
+        eligible = keep & (match.tick - self.spawn_tick[:n] >= game_core.BULLET_GRACE)
+        buckets = match.player_hash.buckets
+        if buckets and eligible.any():
+            cell = match.player_hash.cell_size
+            keys = np.floor_divide(x, cell).astype(np.int64) + np.floor_divide(y, cell).astype(np.int64) * HASH_STRIDE
+            near = np.isin(keys, np.fromiter(buckets, dtype=np.int64, count=len(buckets)))
+            for i in np.nonzero(eligible & near)[0]:
+                if match.resolve_hit(float(x[i]), float(y[i]), match.players[self.owner[i]]):
+                    match.explode(float(x[i]), float(y[i]), self.trail_color(match, i))
+                    keep[i] = False
+
+        # 移除地图外的子弹
+        outside = keep & ((x < 0) | (x > match.width) | (y < 0) | (y > match.height))
+        for i in np.nonzero(outside)[0]:
+            match.explode(float(x[i]), float(y[i]), self.trail_color(match, i))
+            keep[i] = False
+
+        # 压缩数组，去掉已经消失的子弹；压缩前记下它们最后一段轨迹
+        if not keep.all():
+            gone = np.nonzero(~keep)[0]
+            colors = [TRAIL_COLORS.get(player.color, LIGHT_RED) for player in match.players]
+            for serial, px, py, cx, cy, owner in zip(self.serial[gone].tolist(), self.prev_x[gone].tolist(),
+                                                     self.prev_y[gone].tolist(), x[gone].tolist(), y[gone].tolist(),
+                                                     self.owner[gone].tolist()):
+                match.removed.append((serial, [(px, py)] + self.bends.get(serial, [(cx, cy)]), colors[owner]))
+            m = int(np.count_nonzero(keep))
+            for name in self.FIELDS:
+                arr = getattr(self, name)
+                arr[:m] = arr[:n][keep]
+            self.count = m
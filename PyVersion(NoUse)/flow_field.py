@@ -0,0 +1,199 @@
+# 流场寻路：对每个(染色编号, 目标格子)在墙体网格上做一次BFS，得到每格走到目标的步数，
+# 电脑玩家每个tick只需要看相邻格子中步数最小的一个，不用重新寻路。
+# 墙2能不能通过取决于颜色，爆炸改变颜色时只修复受影响的流场：
+# 变得能通过的格子从邻居取步数后向外松弛；变得不能通过的格子先作废只能经过它到达目标的区域，再从边界重新松弛。
+# 目标按ANCHOR_SIZE x ANCHOR_SIZE的块取锚点，同一块内的目标共用一个流场，目标移动时一般不需要新建流场
+import heapq
+from array import array
+from collections import OrderedDict
+
+UNREACHABLE = 0xFFFFFFFF
+ANCHOR_SIZE = 4  # 锚点块的边长（格子数）
+CACHE_SIZE = 64  # 每张地图最多缓存的流场数量，超出时丢弃最久没用过的
+
+
+class FlowField:
+    def __init__(self, grid, paint, target):
+        self.grid = grid
+        self.paint = paint  # 按这个染色编号判断墙2能否通过，0表示墙2都能通过
+        self.target = target  # 目标格子下标
+        self.size = grid.cols * grid.rows
+        self.dist = array("I", [UNREACHABLE]) * self.size  # 每格到目标的步数
+        self.compute()
+
+    def passable(self, index):
+        wall_type = self.grid.types[index]
+        return wall_type == 0 or (wall_type == 2 and (not self.paint or self.grid.colors[index] == self.paint))
+
+    def neighbors(self, index):
+        cols = self.grid.cols
+        col = index % cols
+        result = []
+        if index >= cols:
+            result.append(index - cols)
+        if index + cols < self.size:
+            result.append(index + cols)
+        if col > 0:
+            result.append(index - 1)
+        if col < cols - 1:
+            result.append(index + 1)
+        return result
+
+    def compute(self):
+        # 从目标开始逐层BFS；目标本身即使不能通过也算作起点，这样可以走到它旁边
+        dist = self.dist
+        dist[self.target] = 0
+        frontier = [self.target]
+        d = 0
+        while frontier:
+            d += 1
+            next_frontier = []
+            for index in frontier:
+                for n in self.neighbors(index):
+                    if dist[n] == UNREACHABLE and self.passable(n):
+                        dist[n] = d
+                        next_frontier.append(n)
+            frontier = next_frontier
+
+    def update(self, opened, closed):
+        # opened、closed为本染色编号下变得能通过、不能通过的格子
+        dist = self.dist
+        target = self.target
+
+        # 作废：按步数从小到大处理，轮到某格时比它近一步的格子都已经处理完，
+        # 这时它如果没有任何邻居的步数恰好少1，说明它的最短路径都经过了作废的格子
+        invalid = []
+        pending = []
+        for index in closed:
+            if index != target and dist[index] != UNREACHABLE:
+                d = dist[index]
+                dist[index] = UNREACHABLE
+                for n in self.neighbors(index):
+                    if dist[n] == d + 1:
+                        heapq.heappush(pending, (d + 1, n))
+        while pending:
+            d, index = heapq.heappop(pending)
+            if dist[index] != d or index == target:
+                continue
+            if any(dist[n] == d - 1 for n in self.neighbors(index)):
+                continue
+            dist[index] = UNREACHABLE
+            invalid.append(index)
+            for n in self.neighbors(index):
+                if dist[n] == d + 1:
+                    heapq.heappush(pending, (d + 1, n))
+
+        # 重新松弛：作废的格子和新打通的格子从还有效的邻居取步数，再向外传播
+        for index in invalid + [index for index in opened if self.passable(index)]:
+            best = min((dist[n] for n in self.neighbors(index)), default=UNREACHABLE)
+            if best != UNREACHABLE and best + 1 < dist[index]:
+                heapq.heappush(pending, (best + 1, index))
+        while pending:
+            d, index = heapq.heappop(pending)
+            if d >= dist[index]:
+                continue
+            dist[index] = d
+            for n in self.neighbors(index):
+                if d + 1 < dist[n] and self.passable(n):
+                    heapq.heappush(pending, (d + 1, n))
+
+    def next_cell(self, index):
+        # 相邻格子中步数最小的一个；已经在目标上或者周围都到不了时返回None
+        best = None
+        best_dist = self.dist[index]
+        for n in self.neighbors(index):
+            if self.dist[n] < best_dist:
+                best = n
+                best_dist = self.dist[n]
+        return best
+
+
+# 跟踪墙2颜色的变化，让缓存只处理上次同步之后变了色的格子。
+# 连续的tick直接用match.recolored，中间漏掉过tick时整张比较
+class ColorSync:
+    def __init__(self, grid):
+        self.grid = grid
+        self.colors = bytearray(grid.colors)  # 上次同步时墙2的颜色
+        self.synced_tick = None
+
+    def changes(self, match):
+        # 上次同步之后变色的格子，返回[(格子下标, 原来的颜色, 现在的颜色)]；同一个tick只有第一次调用有结果
+        if self.synced_tick == match.tick:
+            return []
+        colors = self.grid.colors
+        if self.synced_tick is not None and self.synced_tick == match.tick - 1:
+            changed = match.recolored
+        elif self.colors != colors:
+            changed = [index for index in range(len(colors)) if colors[index] != self.colors[index]]
+        else:
+            changed = ()
+        self.synced_tick = match.tick
+        changes = []
+        for index in changed:
+            old = self.colors[index]
+            new = colors[index]
+            if old != new:
+                self.colors[index] = new
+                changes.append((index, old, new))
+        return changes
+
+
+# 一张地图上所有电脑玩家共用的流场缓存，挂在match.flow_fields上
+class FlowFieldCache:
+    def __init__(self, grid, size=CACHE_SIZE):
+        self.grid = grid
+        self.size = size
+        self.fields = OrderedDict()  # (染色编号, 锚点格子) -> FlowField，按最近使用排序
+        self.anchors = {}  # 锚点块 -> 锚点格子
+        self.color_sync = ColorSync(grid)
+        self.builds = 0  # 新建的流场数量
+        self.repairs = 0  # 增量修复的次数
+
+    @classmethod
+    def for_match(cls, match):
+        if match.flow_fields is None:
+            match.flow_fields = cls(match.grid)
+        return match.flow_fields
+
+    def sync(self, match):
+        # 每个tick调用一次，多个电脑玩家共用时只有第一次生效：把上次同步之后变色的格子交给受影响的流场
+        changes = self.color_sync.changes(match)
+        if not changes:
+            return
+        updates = {}  # 染色编号 -> (变得能通过的格子, 变得不能通过的格子)
+        for index, old, new in changes:
+            # 原来的颜色一方从此不能通过，新颜色的一方可以通过
+            updates.setdefault(old, ([], []))[1].append(index)
+            updates.setdefault(new, ([], []))[0].append(index)
+        for field in self.fields.values():
+            if field.paint in updates:
+                field.update(*updates[field.paint])
+                self.repairs += 1
+
+    def anchor(self, index):
+        # 目标所在块的锚点：块中心最近的空格子
+        cols = self.grid.cols
+        row, col = divmod(index, cols)
+        block = (row // ANCHOR_SIZE, col // ANCHOR_SIZE)
+        anchor = self.anchors.get(block)
+        if anchor is None:
+            center_row = min(block[0] * ANCHOR_SIZE + ANCHOR_SIZE // 2, self.grid.rows - 1)
+            center_col = min(block[1] * ANCHOR_SIZE + ANCHOR_SIZE // 2, cols - 1)
+            anchor = self.grid.nearest_open(center_row * cols + center_col)
+            if anchor is None:
+                anchor = index
+            self.anchors[block] = anchor
+        return anchor
+
+    def field(self, paint, target, exact=False):
+        # 走向target所在块的流场；exact=True时直接以target为目标（最后一段路程用）
+        key = (paint, target if exact else self.anchor(target))
+        field = self.fields.get(key)
+        if field is None:
+            field = self.fields[key] = FlowField(self.grid, paint, key[1])
+            self.builds += 1
+            if len(self.fields) > self.size:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(key)
+        return field
@@ -0,0 +1,103 @@
+# 分阶段帧计时：每帧把各阶段（事件、输入、移动、碰撞、爆炸染色、墙、轨迹、玩家和子弹、文字、提交画面）
+# 的耗时写入固定长度的环形缓冲，可以计算分位数或导出CSV。
+# 关闭时mark直接返回，模拟核心上也不挂profiler，几乎没有开销
+import csv
+import time
+from array import array
+
+PHASES = ("events", "input", "movement", "collision", "explosions", "walls", "trails", "sprites", "hud", "present")
+
+
+class FrameProfiler:
+    def __init__(self, size=600, enabled=False):
+        self.size = size
+        self.enabled = enabled
+        self.phase_index = {phase: i for i, phase in enumerate(PHASES)}
+        self.samples = [array("d", bytes(8 * size)) for _ in PHASES]  # 每个阶段一条环形缓冲（秒）
+        self.frame_times = array("d", bytes(8 * size))  # 相邻两帧结束之间的时间（秒），即实际帧间隔
+        self.bullet_counts = array("l", bytes(array("l").itemsize * size))
+        self.count = 0  # 已记录的帧数
+        self.current = [0.0] * len(PHASES)
+        self.frame_start = None
+        self.frame_end = None
+        self.last = 0.0
+        self.nested = 0.0  # 本段中已经由add单独计时的部分，mark时扣除
+
+    def __deepcopy__(self, memo):
+        # 复制对局（如回放快照）时共用同一个profiler
+        return self
+
+    def attach(self, match):
+        # 在模拟核心中计时移动、碰撞和爆炸染色；关闭时传入的对局不挂profiler
+        profiler = self if self.enabled else None
+        match.profiler = profiler
+        match.grid.profiler = profiler
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame_start = now
+        self.last = now
+        self.nested = 0.0
+        self.current = [0.0] * len(PHASES)
+
+    def mark(self, phase):
+        # 从上一次mark到现在的时间记到phase上
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[self.phase_index[phase]] += now - self.last - self.nested
+        self.nested = 0.0
+        self.last = now
+
+    def add(self, phase, seconds):
+        # 记录嵌套在其他阶段中、单独计时的部分（如碰撞中的爆炸染色）
+        self.current[self.phase_index[phase]] += seconds
+        self.nested += seconds
+
+    def end_frame(self, bullets):
+        if not self.enabled or self.frame_start is None:
+            return
+        now = time.perf_counter()
+        slot = self.count % self.size
+        self.frame_times[slot] = now - (self.frame_end if self.frame_end is not None else self.frame_start)
+        self.frame_end = now
+        for i, seconds in enumerate(self.current):
+            self.samples[i][slot] = seconds
+        self.bullet_counts[slot] = bullets
+        self.count += 1
+
+    def recorded(self):
+        # 按时间顺序返回缓冲中的帧下标
+        n = min(self.count, self.size)
+        start = self.count - n
+        return [(start + i) % self.size for i in range(n)]
+
+    def percentile(self, values, q):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary(self):
+        # 返回{名称: (p50, p99)}（毫秒），frame为整帧间隔，work为各阶段之和
+        slots = self.recorded()
+        result = {"frame": [self.frame_times[slot] for slot in slots],
+                  "work": [sum(samples[slot] for samples in self.samples) for slot in slots]}
+        for phase, samples in zip(PHASES, self.samples):
+            result[phase] = [samples[slot] for slot in slots]
+        return {name: (self.percentile(values, 0.5) * 1000, self.percentile(values, 0.99) * 1000)
+                for name, values in result.items()}
+
+    def last_bullets(self):
+        return self.bullet_counts[(self.count - 1) % self.size] if self.count else 0
+
+    def dump_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", "frame_ms", "bullets"] + [f"{phase}_ms" for phase in PHASES])
+            for n, slot in enumerate(self.recorded()):
+                writer.writerow([self.count - min(self.count, self.size) + n,
+                                 round(self.frame_times[slot] * 1000, 4), self.bullet_counts[slot]] +
+                                [round(samples[slot] * 1000, 4) for samples in self.samples])
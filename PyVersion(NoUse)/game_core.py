@@ -0,0 +1,917 @@
+# 游戏模拟核心：不依赖pygame，不需要窗口、字体或effect_surface，
+# 可以在服务器或CI中无界面地运行对局
+import math
+import random
+import time
+from collections import deque
+
+# 地图尺寸
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+
+# 颜色
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+LIGHT_RED = (255, 100, 100)
+LIGHT_BLUE = (100, 100, 255)
+GRAY = (128, 128, 128)
+DARK_GRAY = (64, 64, 64)
+LIGHT_GRAY = (192, 192, 192)
+
+# 队伍颜色：(玩家颜色, 子弹轨迹和染色的颜色)，按队伍编号排列，最多16队
+TEAM_COLORS = [
+    (BLUE, LIGHT_BLUE), (RED, LIGHT_RED), ((0, 160, 0), (120, 210, 120)), ((230, 130, 0), (250, 190, 110)),
+    ((140, 0, 200), (200, 140, 240)), ((0, 170, 190), (110, 220, 230)), ((210, 0, 140), (240, 130, 200)),
+    ((130, 130, 0), (200, 200, 110)), ((140, 70, 20), (205, 160, 120)), ((0, 120, 110), (100, 190, 180)),
+    ((20, 40, 120), (120, 140, 200)), ((120, 20, 40), (200, 120, 140)), ((90, 200, 0), (180, 240, 120)),
+    ((230, 80, 120), (250, 170, 190)), ((200, 160, 0), (240, 215, 110)), ((70, 90, 110), (160, 175, 190)),
+]
+MAX_TEAMS = len(TEAM_COLORS)
+MAX_PLAYERS = 16
+
+# 墙2颜色编号（网格中每格只存一个字节）；前4个编号保持不变，其余队伍的颜色依次排在后面
+PAINT_COLORS = [None, WHITE, LIGHT_RED, LIGHT_BLUE] + [light for _, light in TEAM_COLORS[2:]]
+PAINT_CODES = {color: code for code, color in enumerate(PAINT_COLORS) if color is not None}
+# 各方子弹轨迹和染色使用的颜色
+TRAIL_COLORS = {color: light for color, light in TEAM_COLORS}
+# 各方子弹染出的颜色编号，只有该颜色的墙2允许己方通过
+OWN_PAINT = {color: PAINT_CODES[light] for color, light in TEAM_COLORS}
+
+# 墙的尺寸
+WALL_SIZE = 20
+
+# 子弹与玩家碰撞用的空间哈希：桶的边长（像素），要大于玩家的碰撞范围（防护罩半径）的两倍，
+# 这样每名玩家最多登记到2x2个桶里
+HASH_CELL = 64
+HASH_STRIDE = 1 << 16  # 桶的键为 列 + 行 * HASH_STRIDE
+
+# 默认地图尺寸（格子数），与窗口一样大；更大的地图由摄像机滚动显示
+ARENA_COLS = SCREEN_WIDTH // WALL_SIZE
+ARENA_ROWS = SCREEN_HEIGHT // WALL_SIZE
+
+# 模拟频率：物理按固定的整数tick推进，与渲染帧率无关
+TICK_RATE = 30  # 每秒tick数
+TICK_SECONDS = 1 / TICK_RATE
+
+
+def seconds_to_ticks(seconds):
+    return round(seconds * TICK_RATE)
+
+
+# 射击和受击参数
+PUSH_BACK_FORCE = 2  # 射击时的后坐力
+BULLET_SPEED = 10  # 子弹每tick移动的距离
+BULLET_RADIUS = 5  # 子弹半径
+BULLET_DAMAGE = 10  # 每次命中扣除的血量
+EXPLOSION_RADIUS = 25  # 子弹消失时染色墙2的范围
+MAX_BOUNCES = 4  # 子弹一个tick内最多在墙3上反弹的次数
+ROTATE_SPEED = 0.1  # 键盘转向每tick的角度
+SHIELD_DURATION = seconds_to_ticks(5)  # 防护罩持续时间（tick）
+SHIELD_COOLDOWN = seconds_to_ticks(1)  # 防护罩被击碎或耗尽后的冷却时间（tick）
+BULLET_GRACE = seconds_to_ticks(0.2)  # 子弹射出后不判定击中的时间（tick）
+
+
+# 玩家类（三角形）；玩家、子弹和墙都用__slots__，不为每个实例创建__dict__
+class Player:
+    __slots__ = ("x", "y", "color", "team", "size", "angle", "health", "speed_x", "speed_y", "friction",
+                 "shield_active", "shield_duration", "shield_radius", "shield_remaining", "shield_cooldown",
+                 "shield_button_pressed")
+
+    def __init__(self, x, y, color, team=0):
+        self.x = x
+        self.y = y
+        self.color = color
+        self.team = team  # 队伍编号，同队的子弹不会击中自己人
+        self.size = 15  # 三角形的大小
+        self.angle = 0  # 初始角度
+        self.health = 100
+        self.speed_x = 0  # 水平速度
+        self.speed_y = 0  # 垂直速度
+        self.friction = 0.95  # 摩擦力
+        self.shield_active = False
+        self.shield_duration = SHIELD_DURATION  # 防护罩持续时间（tick）
+        self.shield_radius = 25  # 防护罩半径
+        self.shield_remaining = 0  # 防护罩剩余时间（tick），松开后保留
+        self.shield_cooldown = 0  # 冷却时间（tick）
+        self.shield_button_pressed = False  # 新增：记录按钮是否被按住
+
+    def rotate(self, angle):
+        self.angle = angle
+
+    def move(self, grid):
+        # 更新位置
+        new_x = self.x + self.speed_x
+        new_y = self.y + self.speed_y
+
+        # 检测与墙的碰撞（通过网格索引直接查询目标点所在格子）
+        index = grid.cell_index(new_x, new_y)
+        wall_type = grid.types[index] if index >= 0 else 0
+        if wall_type == 1 or wall_type == 3:
+            collision = True
+        elif wall_type == 2:
+            collision = grid.blocks(index, self.color)
+        else:
+            collision = False
+        if not collision:
+            self.x = new_x
+            self.y = new_y
+
+        # 应用摩擦力
+        self.speed_x *= self.friction
+        self.speed_y *= self.friction
+
+        # 边界检测（地图大小，不是窗口大小）
+        if self.x < 0:
+            self.x = 0
+        elif self.x > grid.width:
+            self.x = grid.width
+        if self.y < 0:
+            self.y = 0
+        elif self.y > grid.height:
+            self.y = grid.height
+
+    def push_back(self, force, angle):
+        # 向指定方向推进
+        self.speed_x += math.cos(angle) * force
+        self.speed_y += math.sin(angle) * force
+
+    def activate_shield(self):
+        if not self.shield_active and self.shield_cooldown <= 0:
+            self.shield_active = True
+            self.shield_button_pressed = True  # 设置按钮为按下状态
+            if self.shield_remaining <= 0:
+                self.shield_remaining = self.shield_duration
+
+    def deactivate_shield(self):
+        if self.shield_active:
+            self.shield_active = False
+            self.shield_button_pressed = False  # 设置按钮为松开状态
+
+    def is_shield_active(self):
+        return self.shield_active and self.shield_button_pressed  # 增加按钮状态检查
+
+    def is_alive(self):
+        return self.health > 0
+
+    def reach(self):
+        # 子弹中心距离小于这个值时可能击中防护罩或玩家
+        return max(self.shield_radius, self.size + BULLET_RADIUS)
+
+    def update(self):
+        # 每tick更新防护罩剩余时间，耗尽后关闭并开始冷却。
+        # 先扣冷却再开始新的冷却，本tick开始的冷却不会在同一个tick里被扣掉，之后整整SHIELD_COOLDOWN个tick不能开启
+        if self.shield_cooldown > 0:
+            self.shield_cooldown -= 1
+        if self.is_shield_active():
+            self.shield_remaining -= 1
+            if self.shield_remaining <= 0:
+                self.deactivate_shield()
+                self.shield_cooldown = SHIELD_COOLDOWN
+
+
+# 子弹类：速度、半径、轨迹颜色和染色编号都由常量或颜色决定，不占实例空间；
+# path和recolored在第一次移动、爆炸前共用空的元组和集合
+NO_CELLS = frozenset()
+
+
+class Bullet:
+    __slots__ = ("x", "y", "angle", "color", "age", "path", "active", "owner", "recolored", "serial")
+
+    def __init__(self, x, y, angle, color, owner):
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.color = color
+        self.age = 0  # 子弹存在的tick数
+        self.path = ()  # 本tick经过的点（起点、反弹点和终点），供渲染层增量绘制轨迹
+        self.active = True  # 子弹是否活跃
+        self.owner = owner  # 子弹的发射者
+        self.recolored = NO_CELLS  # 撞墙爆炸时变色的格子
+        self.serial = 0  # 子弹编号，由Match分配，在整局中唯一
+
+    @property
+    def speed(self):
+        return BULLET_SPEED
+
+    @property
+    def radius(self):
+        return BULLET_RADIUS
+
+    @property
+    def trail_color(self):
+        return TRAIL_COLORS.get(self.color, LIGHT_RED)
+
+    @property
+    def paint(self):
+        # 己方染色编号，决定能穿过哪些墙2
+        return OWN_PAINT.get(self.color, 0)
+
+    def move(self, grid):
+        self.age += 1
+        if self.active:
+            # 连续碰撞检测：沿本tick的整段位移逐格检查，不会穿墙
+            self.path = [(self.x, self.y)]
+            self.x, self.y, self.angle, collision = sweep_bullet(
+                grid, self.x, self.y, self.angle, self.speed, self.paint, self.path)
+            if collision:
+                self.recolored = self.explode(grid)
+                self.active = False
+
+    def is_active(self):
+        # 子弹射出后前0.2秒不判定击中
+        return self.age >= BULLET_GRACE
+
+    def explode(self, grid):
+        return grid.paint_blast(self.x, self.y, self.trail_color)
+
+
+# 子弹的连续碰撞：从(x, y)沿angle移动distance，途经的格子用DDA逐个检查。
+# 墙3按轴对齐的墙面法线反弹，一个tick内可以多次反弹；撞到墙1或不能通过的墙2时停在碰撞点。
+# 返回(x, y, angle, collision)，经过的反弹点和终点依次追加到points中
+def sweep_bullet(grid, x, y, angle, distance, paint, points=None):
+    for _ in range(MAX_BOUNCES + 1):
+        dir_x = math.cos(angle)
+        dir_y = math.sin(angle)
+        hit = grid.trace(x, y, dir_x, dir_y, distance, paint)
+        if hit is None:
+            x += dir_x * distance
+            y += dir_y * distance
+            if points is not None:
+                points.append((x, y))
+            return x, y, angle, False
+        t, index, wall_type, axis = hit
+        x += dir_x * t
+        y += dir_y * t
+        if points is not None:
+            points.append((x, y))
+        if wall_type != 3:
+            return x, y, angle, True
+        # 竖直墙面反弹时水平速度取反，水平墙面反弹时竖直速度取反
+        angle = math.pi - angle if axis == 0 else -angle
+        distance -= t
+    return x, y, angle, False
+
+
+# 墙类（独立的墙对象，用于按Wall列表构建地图的旧代码）
+class Wall:
+    __slots__ = ("x", "y", "wall_type", "color")
+
+    def __init__(self, x, y, wall_type):
+        self.x = x
+        self.y = y
+        self.wall_type = wall_type
+        self.color = WHITE if wall_type == 2 else None
+
+
+# 网格中一格墙的句柄：只保存网格和格子下标，位置、类型和颜色都直接读写网格的数组，
+# 和Wall有相同的属性，但不复制任何数据，颜色也不需要同步
+class WallHandle:
+    __slots__ = ("grid", "index")
+
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+
+    @property
+    def x(self):
+        return self.index % self.grid.cols * WALL_SIZE
+
+    @property
+    def y(self):
+        return self.index // self.grid.cols * WALL_SIZE
+
+    @property
+    def wall_type(self):
+        return self.grid.types[self.index]
+
+    @property
+    def color(self):
+        return PAINT_COLORS[self.grid.colors[self.index]]
+
+    @color.setter
+    def color(self, color):
+        self.grid.set_color(self.index, color)
+
+
+# 爆炸可能波及的格子相对爆炸点所在格子的偏移：爆炸点在本格内任意位置时，
+# 格子中心可能落在爆炸半径内的格子（半径25、格子20时为3x3）。
+# 按半径缓存，EXPLOSION_RADIUS被调整（如match_runner的--set）后第一次爆炸时重新生成
+BLAST_STENCILS = {}  # 半径 -> 偏移列表
+
+
+def blast_stencil(radius):
+    stencil = BLAST_STENCILS.get(radius)
+    if stencil is None:
+        stencil = BLAST_STENCILS[radius] = build_blast_stencil(radius)
+    return stencil
+
+
+def build_blast_stencil(radius):
+    reach = int(radius // WALL_SIZE) + 1
+    stencil = []
+    for dr in range(-reach, reach + 1):
+        for dc in range(-reach, reach + 1):
+            # 本格内的点到偏移格子中心的最近距离
+            near_x = max(0, abs(dc) * WALL_SIZE - WALL_SIZE // 2)
+            near_y = max(0, abs(dr) * WALL_SIZE - WALL_SIZE // 2)
+            if near_x * near_x + near_y * near_y <= radius * radius:
+                stencil.append((dc, dr))
+    return stencil
+
+
+# 墙体网格索引：地图按WALL_SIZE划分格子，每格记录墙的类型和墙2的颜色，
+# 点到墙的查询只需一次下标计算
+class WallGrid:
+    def __init__(self, walls, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        self.cols = width // WALL_SIZE
+        self.rows = height // WALL_SIZE
+        self.width = self.cols * WALL_SIZE  # 地图的像素尺寸
+        self.height = self.rows * WALL_SIZE
+        self.types = bytearray(self.cols * self.rows)  # 0表示没有墙
+        self.colors = bytearray(self.cols * self.rows)  # 墙2的颜色编号，见PAINT_COLORS
+        self.walls = {}  # 格子下标 -> 构建时传入的Wall对象，颜色改变时同步给它们
+        self.dirty = set()  # 颜色改变过、需要重绘的格子下标，由渲染层取走
+        self.profiler = None  # FrameProfiler，不为None时记录爆炸染色的耗时
+        for wall in walls:
+            index = (wall.y // WALL_SIZE) * self.cols + wall.x // WALL_SIZE
+            self.types[index] = wall.wall_type
+            self.colors[index] = PAINT_CODES.get(wall.color, 0)
+            self.walls[index] = wall
+
+    @classmethod
+    def from_cells(cls, cols, rows, types, colors):
+        # 直接由每格的墙类型和颜色编号构建，不创建Wall对象
+        grid = cls((), cols * WALL_SIZE, rows * WALL_SIZE)
+        grid.types[:] = types
+        grid.colors[:] = colors
+        return grid
+
+    def materialize_walls(self):
+        # 为每个有墙的格子创建WallHandle（用于兼容按Wall列表工作的代码），返回列表
+        return [WallHandle(self, index) for index, wall_type in enumerate(self.types) if wall_type]
+
+    def cell_index(self, x, y):
+        # 返回点所在格子的下标，超出地图返回-1
+        col = int(x // WALL_SIZE)
+        row = int(y // WALL_SIZE)
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return row * self.cols + col
+        return -1
+
+    def cell_center(self, index):
+        row, col = divmod(index, self.cols)
+        return (col * WALL_SIZE + WALL_SIZE // 2, row * WALL_SIZE + WALL_SIZE // 2)
+
+    def nearest_open(self, index):
+        # 从index开始按上下左右广度优先，返回最近的没有墙的格子下标
+        seen = {index}
+        queue = deque([index])
+        while queue:
+            index = queue.popleft()
+            if self.types[index] == 0:
+                return index
+            row, col = divmod(index, self.cols)
+            for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= r < self.rows and 0 <= c < self.cols and r * self.cols + c not in seen:
+                    seen.add(r * self.cols + c)
+                    queue.append(r * self.cols + c)
+        return None
+
+    def blocks(self, index, color):
+        # 墙2只允许己方颜色通过：蓝方被浅红和白色挡住，红方被浅蓝和白色挡住
+        own_paint = OWN_PAINT.get(color)
+        return own_paint is not None and self.colors[index] != own_paint
+
+    def paint_blast(self, x, y, color):
+        # 将距离EXPLOSION_RADIUS以内的墙2变为同色，只检查blast_stencil中的格子；返回颜色真正改变了的格子下标
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
+        changed = set()
+        code = PAINT_CODES[color]
+        col = int(x // WALL_SIZE)
+        row = int(y // WALL_SIZE)
+        limit = EXPLOSION_RADIUS * EXPLOSION_RADIUS
+        for dc, dr in blast_stencil(EXPLOSION_RADIUS):
+            c = col + dc
+            r = row + dr
+            if 0 <= c < self.cols and 0 <= r < self.rows:
+                index = r * self.cols + c
+                if self.types[index] == 2:
+                    dx = c * WALL_SIZE + WALL_SIZE // 2 - x
+                    dy = r * WALL_SIZE + WALL_SIZE // 2 - y
+                    if dx * dx + dy * dy <= limit:
+                        if self.colors[index] != code:
+                            changed.add(index)
+                        self.set_color(index, color)
+        if profiler is not None:
+            profiler.add("explosions", time.perf_counter() - start)
+        return changed
+
+    def trace(self, x, y, dir_x, dir_y, distance, paint, passed=None):
+        # 从(x, y)沿单位方向(dir_x, dir_y)逐格行进distance（DDA，起点所在格子不检查），
+        # 返回第一个挡住子弹的格子(距离, 下标, 墙类型, 法线轴)，法线轴0为竖直墙面、1为水平墙面；
+        # paint为子弹的染色编号，同色的墙2可以穿过；途中没有墙返回None。
+        # passed不为None时把穿过的墙2格子依次追加进去（不包括挡住子弹的那一格）
+        col = int(x // WALL_SIZE)
+        row = int(y // WALL_SIZE)
+        if dir_x > 0:
+            step_col, t_max_x, t_delta_x = 1, ((col + 1) * WALL_SIZE - x) / dir_x, WALL_SIZE / dir_x
+        elif dir_x < 0:
+            step_col, t_max_x, t_delta_x = -1, (col * WALL_SIZE - x) / dir_x, -WALL_SIZE / dir_x
+        else:
+            step_col, t_max_x, t_delta_x = 0, math.inf, math.inf
+        if dir_y > 0:
+            step_row, t_max_y, t_delta_y = 1, ((row + 1) * WALL_SIZE - y) / dir_y, WALL_SIZE / dir_y
+        elif dir_y < 0:
+            step_row, t_max_y, t_delta_y = -1, (row * WALL_SIZE - y) / dir_y, -WALL_SIZE / dir_y
+        else:
+            step_row, t_max_y, t_delta_y = 0, math.inf, math.inf
+
+        while True:
+            if t_max_x < t_max_y:
+                t = t_max_x
+                col += step_col
+                t_max_x += t_delta_x
+                axis = 0
+            else:
+                t = t_max_y
+                row += step_row
+                t_max_y += t_delta_y
+                axis = 1
+            if t > distance:
+                return None
+            if 0 <= col < self.cols and 0 <= row < self.rows:
+                index = row * self.cols + col
+                wall_type = self.types[index]
+                if wall_type == 1 or wall_type == 3 or \
+                   (wall_type == 2 and paint and self.colors[index] != paint):
+                    return (t, index, wall_type, axis)
+                if wall_type == 2 and passed is not None:
+                    passed.append(index)
+
+    def set_color(self, index, color):
+        code = PAINT_CODES[color]
+        if self.colors[index] != code:
+            self.colors[index] = code
+            self.dirty.add(index)
+        if self.walls:
+            wall = self.walls.get(index)
+            if wall is not None:
+                wall.color = color
+
+
+# 生成随机地图：整个过程只在紧凑的bytearray网格上进行，最后才一次性生成墙。
+# maze为内部迷宫网格（不含最外圈，1为墙、0为通路），cells为整张地图每格的墙类型。
+# compatible=True时与原来基于Wall列表的生成算法逐步一致：同一个种子（或相同的random全局状态）
+# 得到完全相同的地图；compatible=False用于大地图，打通的墙数随面积增加，可移除的墙只筛选一次。
+# compatible为None时默认尺寸用兼容模式，其他尺寸用大地图模式
+def generate_grid(seed=None, cols=ARENA_COLS, rows=ARENA_ROWS, compatible=None):
+    if compatible is None:
+        compatible = (cols, rows) == (ARENA_COLS, ARENA_ROWS)
+    rng = random if seed is None else random.Random(seed)
+    cells = bytearray(cols * rows)
+
+    # 地图边缘固定为墙1
+    for col in range(cols):
+        cells[col] = 1
+        cells[(rows - 1) * cols + col] = 1
+    for row in range(1, rows - 1):
+        cells[row * cols] = 1
+        cells[row * cols + cols - 1] = 1
+
+    # 初始化迷宫网格
+    grid_width = cols - 2
+    grid_height = rows - 2
+    maze = bytearray(b"\x01" * (grid_width * grid_height))
+
+    def cell(x, y):
+        # 迷宫坐标对应的地图格子下标
+        return (y + 1) * cols + x + 1
+
+    def open_block(x, y):
+        # 打通(x, y)及其右、下、右下共2x2个单元格
+        maze[y * grid_width + x] = 0
+        if x + 1 < grid_width:
+            maze[y * grid_width + x + 1] = 0
+        if y + 1 < grid_height:
+            maze[(y + 1) * grid_width + x] = 0
+        if x + 1 < grid_width and y + 1 < grid_height:
+            maze[(y + 1) * grid_width + x + 1] = 0
+
+    def visit(x, y, stack):
+        open_block(x, y)
+        directions = [(0, 3), (3, 0), (0, -3), (-3, 0)]  # 步长为3
+        rng.shuffle(directions)
+        stack.append([x, y, directions, 0])
+
+    # 用显式栈代替递归DFS，大地图不会超过递归深度；随机数的消耗顺序与递归版本相同
+    start_x = rng.randint(0, (grid_width - 1) // 2) * 2
+    start_y = rng.randint(0, (grid_height - 1) // 2) * 2
+    stack = []
+    visit(start_x, start_y, stack)
+    while stack:
+        frame = stack[-1]
+        x, y, directions, i = frame
+        if i == len(directions):
+            stack.pop()
+            continue
+        frame[3] = i + 1
+        dx, dy = directions[i]
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < grid_width and 0 <= ny < grid_height and maze[ny * grid_width + nx] == 1:
+            # 打通中间的墙，保持2个单元格的间隔
+            open_block(x + dx // 3, y + dy // 3)
+            visit(nx, ny, stack)
+
+    # 迷宫中的墙随机分配类型
+    for y in range(grid_height):
+        for x in range(grid_width):
+            if maze[y * grid_width + x] == 1:
+                cells[cell(x, y)] = rng.choices([1, 2, 3], weights=[1, 3, 1])[0]
+
+    # 减少死胡同的数量：3面是墙的通路随机打通一个方向
+    for y in range(1, grid_height - 1):
+        for x in range(1, grid_width - 1):
+            if maze[y * grid_width + x] == 0:
+                walls_around = (maze[(y - 1) * grid_width + x] + maze[(y + 1) * grid_width + x] +
+                                maze[y * grid_width + x - 1] + maze[y * grid_width + x + 1])
+                if walls_around >= 3:
+                    directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+                    rng.shuffle(directions)
+                    for dx, dy in directions:
+                        nx, ny = x + dx, y + dy
+                        if maze[ny * grid_width + nx] == 1:
+                            maze[ny * grid_width + nx] = 0
+                            cells[cell(nx, ny)] = 0
+                            break
+
+    def wall_flags(x, y):
+        # 迷宫坐标(x, y)上下左右是否有墙
+        above = y - 1 >= 0 and maze[(y - 1) * grid_width + x] == 1
+        below = y + 1 < grid_height and maze[(y + 1) * grid_width + x] == 1
+        left = x - 1 >= 0 and maze[y * grid_width + x - 1] == 1
+        right = x + 1 < grid_width and maze[y * grid_width + x + 1] == 1
+        return above, below, left, right
+
+    # 不在边缘的格子范围（地图坐标）
+    inner_cols = range(2, cols - 2)
+    inner_rows = range(2, rows - 2)
+
+    def carve(x, y, vertical, horizontal):
+        # 打通迷宫坐标(x, y)处的墙（2x2），并按方向打通紧贴的另一堵墙
+        for dx in range(2):
+            for dy in range(2):
+                if 0 <= x + dx < grid_width and 0 <= y + dy < grid_height:
+                    maze[(y + dy) * grid_width + x + dx] = 0
+        cells[cell(x, y)] = 0
+        # 检查上下方向
+        if vertical:
+            if y - 1 >= 0 and maze[(y - 1) * grid_width + x] == 1:
+                if cells[cell(x, y - 1)]:
+                    for dx in range(2):
+                        if 0 <= x + dx < grid_width:
+                            maze[(y - 1) * grid_width + x + dx] = 0
+                    cells[cell(x, y - 1)] = 0
+            elif y + 1 < grid_height and maze[(y + 1) * grid_width + x] == 1:
+                if cells[cell(x, y + 1)]:
+                    for dx in range(2):
+                        if 0 <= x + dx < grid_width:
+                            maze[(y + 1) * grid_width + x + dx] = 0
+                    cells[cell(x, y + 1)] = 0
+        # 检查左右方向
+        elif horizontal:
+            if x - 1 >= 0 and maze[y * grid_width + x - 1] == 1:
+                if cells[cell(x - 1, y)]:
+                    for dy in range(2):
+                        if 0 <= y + dy < grid_height:
+                            maze[(y + dy) * grid_width + x - 1] = 0
+                    cells[cell(x - 1, y)] = 0
+            elif x + 1 < grid_width and maze[y * grid_width + x + 1] == 1:
+                if cells[cell(x + 1, y)]:
+                    for dy in range(2):
+                        if 0 <= y + dy < grid_height:
+                            maze[(y + dy) * grid_width + x + 1] = 0
+                    cells[cell(x + 1, y)] = 0
+
+    if compatible:
+        # 随机打通30处不在边缘的墙；与原算法一致，每次重新筛选，
+        # 打通相邻墙时沿用筛选时最后检查的那堵墙的方向
+        for _ in range(30):
+            removable = []
+            flags = None
+            for row in inner_rows:
+                for col in inner_cols:
+                    if cells[row * cols + col]:
+                        flags = wall_flags(col - 1, row - 1)
+                        above, below, left, right = flags
+                        if not (above or below) or not (left or right):
+                            removable.append(row * cols + col)
+            if removable:
+                row, col = divmod(rng.choice(removable), cols)
+                above, below, left, right = flags
+                carve(col - 1, row - 1, not (above or below), not (left or right))
+    else:
+        # 大地图：打通的数量按面积放大，可移除的墙只筛选一次，抽中后再确认是否仍可移除
+        carve_outs = 30 * grid_width * grid_height // ((ARENA_COLS - 2) * (ARENA_ROWS - 2))
+        candidates = [row * cols + col for row in inner_rows for col in inner_cols if cells[row * cols + col]]
+        while carve_outs > 0 and candidates:
+            k = rng.randrange(len(candidates))
+            index = candidates[k]
+            candidates[k] = candidates[-1]
+            candidates.pop()
+            if not cells[index]:
+                continue
+            row, col = divmod(index, cols)
+            above, below, left, right = wall_flags(col - 1, row - 1)
+            vertical = not (above or below)
+            horizontal = not (left or right)
+            if vertical or horizontal:
+                carve(col - 1, row - 1, vertical, horizontal)
+                carve_outs -= 1
+
+    # 将所有不在边缘的墙变为type2
+    colors = bytearray(cols * rows)
+    for row in inner_rows:
+        for col in inner_cols:
+            if cells[row * cols + col]:
+                cells[row * cols + col] = 2
+    for index, wall_type in enumerate(cells):
+        if wall_type == 2:
+            colors[index] = PAINT_CODES[WHITE]
+
+    return WallGrid.from_cells(cols, rows, cells, colors)
+
+
+# 生成随机地图，返回独立的Wall列表
+def generate_map(seed=None):
+    walls = []
+    for handle in generate_grid(seed).materialize_walls():
+        wall = Wall(handle.x, handle.y, handle.wall_type)
+        wall.color = handle.color
+        walls.append(wall)
+    return walls
+
+
+# 固定步长时钟：累积渲染帧的真实耗时，换算成本帧要推进的整数tick数。
+# 渲染掉帧时物理照常补齐，卡顿过久时丢弃多余时间，避免越追越慢
+class TickClock:
+    def __init__(self, tick_rate=TICK_RATE, max_ticks_per_frame=5):
+        self.tick_seconds = 1 / tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.accumulator = 0.0
+
+    def advance(self, elapsed):
+        self.accumulator += elapsed
+        ticks = int(self.accumulator // self.tick_seconds)
+        if ticks > self.max_ticks_per_frame:
+            ticks = self.max_ticks_per_frame
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.tick_seconds
+        return ticks
+
+
+# 子弹与玩家碰撞用的空间哈希：每个tick玩家移动完后重建，玩家按碰撞范围登记到覆盖的每个桶中，
+# 子弹只需要查自己所在的一个桶，结算的开销只和附近的玩家数量有关，与总人数无关。
+# 桶内按玩家下标顺序排列，结算顺序与逐个检查所有玩家时相同
+class SpatialHash:
+    def __init__(self, cell_size=HASH_CELL):
+        self.cell_size = cell_size
+        self.buckets = {}  # 键 -> 玩家列表
+
+    def key(self, x, y):
+        return int(x // self.cell_size) + int(y // self.cell_size) * HASH_STRIDE
+
+    def rebuild(self, players):
+        buckets = self.buckets = {}
+        size = self.cell_size
+        for player in players:
+            if not player.is_alive():
+                continue
+            reach = player.reach()
+            for row in range(int((player.y - reach) // size), int((player.y + reach) // size) + 1):
+                for col in range(int((player.x - reach) // size), int((player.x + reach) // size) + 1):
+                    bucket = buckets.get(col + row * HASH_STRIDE)
+                    if bucket is None:
+                        buckets[col + row * HASH_STRIDE] = [player]
+                    else:
+                        bucket.append(player)
+
+    def nearby(self, x, y):
+        return self.buckets.get(self.key(x, y), ())
+
+
+def spawn_points(grid, teams):
+    # 出生点：两人对战时沿用原来的左右两点；更多玩家时均匀分布在椭圆上（同队相邻），
+    # 落在墙里的挪到最近的空格子中心
+    width, height = grid.width, grid.height
+    if len(teams) == 2:
+        return [(width // 4, height // 2), (3 * width // 4, height // 2)]
+    order = sorted(range(len(teams)), key=lambda i: teams[i])
+    points = [None] * len(teams)
+    for slot, i in enumerate(order):
+        angle = math.pi + 2 * math.pi * slot / len(teams)
+        x = width / 2 + math.cos(angle) * width * 0.35
+        y = height / 2 + math.sin(angle) * height * 0.35
+        index = grid.nearest_open(grid.cell_index(x, y))
+        points[i] = grid.cell_center(index) if index is not None else (x, y)
+    return points
+
+
+# 一局对战：持有地图、玩家和子弹，step()推进一个tick并结算子弹、防护罩和血量。
+# 默认两人各自一队；players指定人数（2~16），teams按玩家顺序给出队伍编号，最后只剩一队存活时结束。
+# vectorized=True时子弹改用bullet_array中的NumPy批量实现
+class Match:
+    def __init__(self, walls=None, vectorized=False, seed=None, grid=None, arena=None, players=2, teams=None):
+        self.seed = seed  # 地图种子，None表示使用random的全局状态
+        self.wall_list = walls  # Wall列表，只有访问match.walls时才为网格创建句柄
+        if walls is not None:
+            self.grid = WallGrid(walls)
+        else:
+            # grid为预先生成好的地图（例如来自MapPool），否则按arena=(列数, 行数)现场生成
+            if grid is None:
+                grid = generate_grid(seed, *(arena or (ARENA_COLS, ARENA_ROWS)))
+            self.grid = grid
+        self.width = self.grid.width  # 地图的像素尺寸，可以比窗口大
+        self.height = self.grid.height
+        if teams is None:
+            teams = list(range(players))  # 各自一队
+        if not 2 <= len(teams) <= MAX_PLAYERS or not all(0 <= team < MAX_TEAMS for team in teams):
+            raise ValueError(f"需要2~{MAX_PLAYERS}名玩家，队伍编号为0~{MAX_TEAMS - 1}")
+        if len(set(teams)) < 2:
+            # 只有一支队伍时一开局就没有对手，对局永远不会结束
+            raise ValueError("至少需要两支不同的队伍")
+        self.players = [Player(x, y, TEAM_COLORS[team][0], team)
+                        for (x, y), team in zip(spawn_points(self.grid, teams), teams)]
+        self.player1 = self.players[0]
+        self.player2 = self.players[1]
+        self.teams = list(teams)  # 每名玩家的队伍编号
+        self.team_mode = len(set(teams)) < len(teams)  # 有多人同队时按队伍显示胜者
+        self.player_hash = SpatialHash()
+        self.player_hash.rebuild(self.players)
+        self.vectorized = vectorized
+        if vectorized:
+            from bullet_array import BulletArray
+            self.bullets = BulletArray()
+        else:
+            self.bullets = []
+        self.game_over = False
+        self.winner = None  # 胜者名称
+        self.winning_team = None  # 胜者的队伍编号
+        self.tick = 0  # 已推进的tick数
+        self.explosions = []  # 本帧子弹消失的位置和颜色，供渲染层绘制爆炸效果
+        self.removed = []  # 本tick消失的子弹(标识, 本tick经过的点, 轨迹颜色)，供渲染层补画最后一段轨迹
+        self.recolored = set()  # 本tick爆炸中变色的墙2格子下标
+        # 整局统计，按match.players的下标记录
+        self.shots = [0] * len(self.players)  # 射出的子弹数
+        self.hits = [0] * len(self.players)  # 命中对手的次数
+        self.shield_blocks = [0] * len(self.players)  # 防护罩挡下的子弹数
+        self.recolors = 0  # 墙2变色的总次数
+        self.next_serial = 0  # 下一颗普通子弹的编号（BulletArray自己编号）
+        self.profiler = None  # FrameProfiler，不为None时分阶段记录step的耗时
+        self.flow_fields = None  # FlowFieldCache，电脑玩家第一次寻路时创建，同一局的电脑玩家共用
+        self.sight = None  # SightCache，第一次查询视线或反弹射击时创建
+
+    @property
+    def walls(self):
+        if self.wall_list is None:
+            self.wall_list = self.grid.materialize_walls()
+        return self.wall_list
+
+    def player_name(self, player):
+        return f"Player {self.players.index(player) + 1}"
+
+    def team_name(self, team):
+        if self.team_mode:
+            return f"Team {team + 1}"
+        return self.player_name(next(player for player in self.players if player.team == team))
+
+    def alive_teams(self):
+        return {player.team for player in self.players if player.is_alive()}
+
+    def fire(self, player):
+        # 射击：从三角形尾部射出子弹，玩家受到反向推力；防护罩开启或已经阵亡时不能射击
+        if self.game_over or player.is_shield_active() or not player.is_alive():
+            return None
+        if self.vectorized:
+            bullet = self.bullets.spawn(player.x, player.y, player.angle + math.pi,
+                                        self.players.index(player), self.tick,
+                                        OWN_PAINT.get(player.color, 0))
+        else:
+            bullet = Bullet(player.x, player.y, player.angle + math.pi, player.color, player)
+            bullet.serial = self.next_serial
+            self.next_serial += 1
+            self.bullets.append(bullet)
+        self.shots[self.players.index(player)] += 1
+        player.push_back(PUSH_BACK_FORCE, player.angle)
+        return bullet
+
+    def explode(self, x, y, color):
+        # 子弹消失：染色周围的墙2并记录爆炸，返回变色的格子
+        changed = self.grid.paint_blast(x, y, color)
+        self.recolored |= changed
+        self.recolors += len(changed)
+        self.explosions.append((x, y, color))
+        return changed
+
+    def remove_bullet(self, bullet):
+        self.explode(bullet.x, bullet.y, bullet.trail_color)
+        self.bullets.remove(bullet)
+        self.removed.append((bullet, bullet.path, bullet.trail_color))
+
+    def step(self):
+        self.tick += 1
+        self.explosions = []
+        self.removed = []
+        self.recolored = set()
+        profiler = self.profiler
+        if not self.game_over:
+            # 移动玩家，然后按新位置重建空间哈希
+            for player in self.players:
+                if player.is_alive():
+                    player.move(self.grid)
+            self.player_hash.rebuild(self.players)
+            if profiler is not None:
+                profiler.mark("movement")
+
+            if self.vectorized:
+                self.bullets.step(self)
+            else:
+                self.step_bullets()
+            if profiler is not None:
+                profiler.mark("collision")
+
+        # 更新玩家状态
+        for player in self.players:
+            player.update()
+        if profiler is not None:
+            profiler.mark("movement")
+
+    def step_bullets(self):
+        # 移动子弹，撞墙的子弹直接移除
+        for bullet in self.bullets[:]:
+            bullet.move(self.grid)
+            if not bullet.active:
+                self.bullets.remove(bullet)
+                self.recolored |= bullet.recolored
+                self.recolors += len(bullet.recolored)
+                self.explosions.append((bullet.x, bullet.y, bullet.trail_color))
+                self.removed.append((bullet, bullet.path, bullet.trail_color))
+
+        # 检测子弹与防护罩、玩家的碰撞
+        for bullet in self.bullets[:]:
+            if bullet.is_active() and self.resolve_hit(bullet.x, bullet.y, bullet.owner):
+                self.remove_bullet(bullet)
+
+        # 移除地图外的子弹
+        for bullet in self.bullets[:]:
+            if bullet.x < 0 or bullet.x > self.width or bullet.y < 0 or bullet.y > self.height:
+                self.remove_bullet(bullet)
+
+    def run(self, ticks):
+        # 无界面快进：连续推进指定的tick数，对局结束时提前停止
+        for _ in range(ticks):
+            if self.game_over:
+                break
+            self.step()
+
+    def resolve_hit(self, x, y, owner):
+        # 结算位于(x, y)的子弹与防护罩、玩家的碰撞，命中时返回True，由调用方移除子弹；
+        # 只检查空间哈希中同一个桶里的玩家
+        nearby = self.player_hash.nearby(x, y)
+        if not nearby:
+            return False
+        # 检测防护罩（包括发射者自己和队友的防护罩）
+        for player in nearby:
+            if player.is_shield_active():
+                dx = x - player.x
+                dy = y - player.y
+                if dx * dx + dy * dy < player.shield_radius * player.shield_radius:
+                    self.shield_blocks[self.players.index(player)] += 1
+                    player.deactivate_shield()
+                    # 被击碎时开始冷却；本tick结束时的update还会扣掉1
+                    player.shield_cooldown = SHIELD_COOLDOWN + 1
+                    return True
+        # 忽略与发射者和队友的碰撞，已经阵亡的玩家不再被击中
+        for player in nearby:
+            if player.team == owner.team or not player.is_alive():
+                continue
+            dx = x - player.x
+            dy = y - player.y
+            reach = player.size + BULLET_RADIUS
+            if dx * dx + dy * dy < reach * reach:
+                player.health -= BULLET_DAMAGE
+                self.hits[self.players.index(owner)] += 1
+                if not player.is_alive():
+                    player.deactivate_shield()
+                if not player.is_alive() and not self.game_over:
+                    teams = self.alive_teams()
+                    if len(teams) <= 1:
+                        self.game_over = True
+                        self.winning_team = teams.pop() if teams else owner.team
+                        self.winner = self.team_name(self.winning_team)
+                return True
+        return False
@@ -0,0 +1,194 @@
+# 输入层：把pygame事件的采样和渲染帧解耦。
+# poll()在一帧中调用多次（帧开始、每个tick之前、画完地图之后、等待下一帧之后），每次取走事件并记下取到的时间，
+# 换算成玩家指令放进按时间排序的队列；dispatch()在每个tick开始前执行时间不晚于这个tick的指令，
+# 慢帧补tick时，输入按真实的先后落到各自的tick上，而不是都挤在这一帧的第一个tick。
+# 每条指令从取到事件到进入模拟的时间记在环形缓冲里，可以查看p50/p99延迟。
+# 触摸按手指编号跟踪：手指按下时落在哪名玩家的按钮或摇杆区域，之后的移动和抬起都只作用于它，
+# 两名玩家同屏操作时手指划过中线也不会抢到对方的摇杆
+import math
+import time
+from array import array
+from collections import deque
+
+import pygame
+
+from replay import snap_angle, FIRE, SHIELD_ON, SHIELD_OFF, TURN_LEFT, TURN_RIGHT, SET_ANGLE
+
+# 只在队列内部使用的状态指令，执行时改变按住的状态，之后每个tick按状态发出输入
+HOLD_TURN = "hold_turn"  # 参数为(TURN_LEFT或TURN_RIGHT, 是否按住)
+AIM = "aim"  # 参数为摇杆的朝向，松开摇杆时为None
+
+
+# 一名玩家的键盘按键和触控控件
+class PlayerControls:
+    def __init__(self, region, joystick, fire_button, shield_button, fire_keys, shield_keys, left_key, right_key):
+        self.region = region  # 屏幕上属于这名玩家摇杆的区域（pygame.Rect）
+        self.joystick = joystick
+        self.fire_button = fire_button
+        self.shield_button = shield_button
+        self.fire_keys = fire_keys  # 射击键，可以有多个
+        self.shield_keys = shield_keys  # 按住开防护罩的键
+        self.left_key = left_key
+        self.right_key = right_key
+
+
+class InputQueue:
+    def __init__(self, controls, screen_size, latency_size=600):
+        self.controls = controls  # 按玩家下标排列的PlayerControls
+        self.screen_size = screen_size  # 触摸坐标是0~1的比例，换算成像素
+        self.enabled = True  # 为False时（对局结束、回放中）新按下的键和手指不算玩家操作，交给主循环
+        self.key_down = {}  # 按键 -> (玩家下标, 指令, 参数)
+        self.key_up = {}
+        for index, control in enumerate(controls):
+            for key in control.fire_keys:
+                self.key_down[key] = (index, FIRE, None)
+            for key in control.shield_keys:
+                self.key_down[key] = (index, SHIELD_ON, None)
+                self.key_up[key] = (index, SHIELD_OFF, None)
+            for key, turn in ((control.left_key, TURN_LEFT), (control.right_key, TURN_RIGHT)):
+                self.key_down[key] = (index, HOLD_TURN, (turn, True))
+                self.key_up[key] = (index, HOLD_TURN, (turn, False))
+        self.commands = deque()  # (取到事件的时间, 玩家下标, 指令, 参数)，按时间排序
+        self.events = []  # 不是玩家操作的事件（退出、功能键、重开按钮、回放控制等），由主循环处理
+        self.fingers = {}  # 手指编号 -> (玩家下标, 控件："fire"、"shield"或"joystick")
+        self.turning = [set() for _ in controls]  # 每名玩家按住的转向键（TURN_LEFT/TURN_RIGHT）
+        self.aims = [None] * len(controls)  # 每名玩家摇杆的朝向，没有推摇杆时为None
+        self.last_key_time = -math.inf  # 最后一次按键的时间（perf_counter），用于自动隐藏触控按钮
+        self.latencies = array("d", bytes(8 * latency_size))  # 环形缓冲（秒）
+        self.latency_count = 0
+
+    def poll(self):
+        # 取走当前所有事件：玩家操作进入指令队列，其余留给take_events
+        now = time.perf_counter()
+        for event in pygame.event.get():
+            if not self.handle(event, now):
+                self.events.append(event)
+
+    def take_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def push(self, stamp, index, op, value=None):
+        # 停用时不会再有dispatch：按住的状态立即更新，射击和防护罩指令丢弃
+        if self.enabled:
+            self.commands.append((stamp, index, op, value))
+        else:
+            self.apply(None, index, op, value, None)
+
+    def handle(self, event, now):
+        # 把一个事件换成指令，返回是否已经处理
+        if event.type == pygame.KEYDOWN:
+            self.last_key_time = now
+            command = self.key_down.get(event.key)
+            if command is None or not self.enabled:
+                return False
+            self.push(now, *command)
+            return True
+        if event.type == pygame.KEYUP:
+            # 松开总是处理，避免对局结束时松开的键一直算作按住
+            command = self.key_up.get(event.key)
+            if command is None:
+                return False
+            self.push(now, *command)
+            return True
+        if event.type == pygame.FINGERDOWN:
+            return self.enabled and self.finger_down(event, now)
+        if event.type == pygame.FINGERMOTION:
+            owner = self.fingers.get(event.finger_id)
+            if owner is None:
+                return False
+            index, widget = owner
+            if widget == "joystick":
+                self.move_joystick(index, self.touch_pos(event), now)
+            return True
+        if event.type == pygame.FINGERUP:
+            owner = self.fingers.pop(event.finger_id, None)
+            if owner is None:
+                return False
+            index, widget = owner
+            if widget == "shield":
+                self.push(now, index, SHIELD_OFF)
+            elif widget == "joystick":
+                joystick = self.controls[index].joystick
+                joystick.dx = 0
+                joystick.dy = 0
+                self.push(now, index, AIM, None)
+            return True
+        return False
+
+    def touch_pos(self, event):
+        return (int(event.x * self.screen_size[0]), int(event.y * self.screen_size[1]))
+
+    def finger_down(self, event, now):
+        pos = self.touch_pos(event)
+        for index, control in enumerate(self.controls):
+            if control.fire_button.is_pressed(pos):
+                self.fingers[event.finger_id] = (index, "fire")
+                self.push(now, index, FIRE)
+                return True
+            if control.shield_button.is_pressed(pos):
+                self.fingers[event.finger_id] = (index, "shield")
+                self.push(now, index, SHIELD_ON)
+                return True
+        for index, control in enumerate(self.controls):
+            if control.region.collidepoint(pos):
+                # 摇杆已经被另一根手指按住时不抢
+                if (index, "joystick") in self.fingers.values():
+                    return False
+                self.fingers[event.finger_id] = (index, "joystick")
+                self.move_joystick(index, pos, now)
+                return True
+        return False
+
+    def move_joystick(self, index, pos, now):
+        joystick = self.controls[index].joystick
+        joystick.update(pos)
+        angle = math.atan2(joystick.dy, joystick.dx) if joystick.dx != 0 or joystick.dy != 0 else None
+        self.push(now, index, AIM, angle)
+
+    def dispatch(self, match, until, send):
+        # 在一个tick开始前调用：执行时间不晚于until的指令，再把按住的转向键和摇杆朝向作用到这个tick上。
+        # send与recorder.send相同，指令因此也会被录像记录
+        now = time.perf_counter()
+        commands = self.commands
+        while commands and commands[0][0] <= until:
+            stamp, index, op, value = commands.popleft()
+            self.apply(match, index, op, value, send)
+            self.latencies[self.latency_count % len(self.latencies)] = now - stamp
+            self.latency_count += 1
+        for index, turning in enumerate(self.turning):
+            for op in (TURN_LEFT, TURN_RIGHT):
+                if op in turning:
+                    send(match, index, op)
+        if not match.game_over:
+            # 摇杆朝向不变时不重复发送
+            for index, angle in enumerate(self.aims):
+                if angle is not None and snap_angle(angle) != match.players[index].angle:
+                    send(match, index, SET_ANGLE, angle)
+
+    def apply(self, match, index, op, value, send):
+        if op == HOLD_TURN:
+            turn, held = value
+            if held:
+                self.turning[index].add(turn)
+            else:
+                self.turning[index].discard(turn)
+        elif op == AIM:
+            self.aims[index] = value
+        elif send is not None:
+            send(match, index, op, value)
+
+    def clear(self):
+        # 换到新的一局时调用：丢弃还没执行的射击和防护罩指令，按住的状态照常更新
+        while self.commands:
+            stamp, index, op, value = self.commands.popleft()
+            self.apply(None, index, op, value, None)
+
+    def latency_summary(self):
+        # 最近的输入延迟(p50, p99)（毫秒），还没有记录时为None
+        n = min(self.latency_count, len(self.latencies))
+        if not n:
+            return None
+        values = sorted(self.latencies[:n])
+        return values[n // 2] * 1000, values[min(n - 1, int(0.99 * n))] * 1000
@@ -0,0 +1,200 @@
+# 视线与反弹射击查询：回答“从这里朝这个角度射出的子弹能不能打到那名玩家、要反弹几次”。
+# 子弹路径和游戏中一样用grid.trace逐格计算：墙3反弹，墙1和挡住该颜色的墙2让子弹爆炸；
+# 命中按子弹每个tick结束时的位置判定，射出后BULLET_GRACE个tick内不算，距离和Match.resolve_hit一致。
+# 格子之间的直线视线、格子之间能打中的反弹角度按地图缓存，每条记录保存能影响结果的墙2格子，
+# 墙2变色时只作废包含这些格子、并且对该颜色的通过与否真正改变了的记录
+import math
+from collections import OrderedDict
+
+import game_core
+from game_core import OWN_PAINT
+from flow_field import ColorSync
+
+SHOT_BOUNCES = 3  # 默认最多考虑的反弹次数
+ANGLE_STEPS = 256  # 搜索反弹射击时在一整圈中尝试的角度数
+CACHE_SIZE = 1 << 16  # 每张地图最多缓存的记录数，超出时丢弃最久没用过的
+
+
+def shot_path(grid, x, y, angle, paint, bounces=SHOT_BOUNCES, passed=None, stops=None):
+    # 子弹从(x, y)沿angle飞出的折线，返回每段的(起点x, 起点y, dir_x, dir_y, 起点处已飞行的距离, 长度)，
+    # 每段以一次墙3反弹结束，最后一段停在爆炸点或者第bounces次反弹处。
+    # passed不为None时追加穿过的本色墙2格子，stops不为None时追加挡住子弹的墙2格子
+    limit = 2 * (grid.width + grid.height)  # 地图边缘是墙1，正常情况下到不了这个长度
+    segments = []
+    travelled = 0
+    for _ in range(bounces + 1):
+        dir_x = math.cos(angle)
+        dir_y = math.sin(angle)
+        hit = grid.trace(x, y, dir_x, dir_y, limit, paint, passed)
+        if hit is None:
+            segments.append((x, y, dir_x, dir_y, travelled, limit))
+            break
+        t, index, wall_type, axis = hit
+        segments.append((x, y, dir_x, dir_y, travelled, t))
+        if wall_type == 2 and stops is not None:
+            stops.append(index)
+        if wall_type != 3:
+            break
+        x += dir_x * t
+        y += dir_y * t
+        travelled += t
+        angle = math.pi - angle if axis == 0 else -angle
+    return segments
+
+
+def segment_hit(segment, target_x, target_y, reach):
+    # 这一段上第一个离目标小于reach的tick采样点（飞行距离为BULLET_SPEED的整数倍），返回飞行的tick数
+    x, y, dir_x, dir_y, start, length = segment
+    dx = target_x - x
+    dy = target_y - y
+    along = dx * dir_x + dy * dir_y
+    across = dx * dx + dy * dy - along * along
+    if across >= reach * reach:
+        return None
+    half = math.sqrt(reach * reach - across)
+    low = max(start + along - half, start, game_core.BULLET_GRACE * game_core.BULLET_SPEED)
+    high = min(start + along + half, start + length)
+    tick = math.ceil(low / game_core.BULLET_SPEED)
+    while tick * game_core.BULLET_SPEED < high:
+        t = tick * game_core.BULLET_SPEED - start
+        px = x + dir_x * t - target_x
+        py = y + dir_y * t - target_y
+        if px * px + py * py < reach * reach:
+            return tick
+        tick += 1
+    return None
+
+
+def shot_result(grid, x, y, angle, paint, target_x, target_y, reach, bounces=SHOT_BOUNCES):
+    # 从(x, y)朝angle射出的子弹能否打到(target_x, target_y)处的目标：返回(反弹次数, 飞行的tick数)，打不到返回None
+    for count, segment in enumerate(shot_path(grid, x, y, angle, paint, bounces)):
+        tick = segment_hit(segment, target_x, target_y, reach)
+        if tick is not None:
+            return count, tick
+    return None
+
+
+def target_reach(target):
+    # 子弹中心离目标小于这个距离时命中；防护罩开着时先被防护罩挡下
+    if target.is_shield_active():
+        return target.shield_radius
+    return target.size + game_core.BULLET_RADIUS
+
+
+# 一张地图的视线缓存，挂在match.sight上，所有电脑玩家和辅助瞄准共用
+class SightCache:
+    def __init__(self, grid, size=CACHE_SIZE):
+        self.grid = grid
+        self.size = size
+        self.entries = OrderedDict()  # key -> (结果, 能影响结果的墙2格子)，按最近使用排序
+        self.by_cell = {}  # 墙2格子下标 -> 包含它的记录的key
+        self.color_sync = ColorSync(grid)
+        self.hits = 0  # 命中缓存的查询数
+        self.misses = 0  # 需要重新计算的查询数
+        self.invalidated = 0  # 因墙2变色作废的记录数
+
+    @classmethod
+    def for_match(cls, match):
+        if match.sight is None:
+            match.sight = cls(match.grid)
+        return match.sight
+
+    def sync(self, match):
+        # 每个tick查询前调用，同一个tick只有第一次生效：作废受变色影响的记录
+        for index, old, new in self.color_sync.changes(match):
+            keys = self.by_cell.get(index)
+            if keys:
+                # key[1]为染色编号：只有原来或现在是这个颜色时，这一格对它的通过与否才会改变
+                for key in [key for key in keys if key[1] and (old == key[1]) != (new == key[1])]:
+                    self.drop(key)
+                    self.invalidated += 1
+
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for index in entry[1]:
+            keys = self.by_cell.get(index)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_cell[index]
+
+    def cached(self, key, compute):
+        # compute(cells)计算结果，并把能影响结果的墙2格子追加到cells
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        cells = []
+        result = compute(cells)
+        cells = frozenset(cells)
+        self.entries[key] = (result, cells)
+        for index in cells:
+            self.by_cell.setdefault(index, set()).add(key)
+        if len(self.entries) > self.size:
+            self.drop(next(iter(self.entries)))
+        return result
+
+    def visible(self, source, target, paint):
+        # 从source格子中心到target格子中心的直线上有没有挡住该颜色子弹的墙（墙3也算挡住）
+        def compute(cells):
+            x, y = self.grid.cell_center(source)
+            tx, ty = self.grid.cell_center(target)
+            distance = math.hypot(tx - x, ty - y)
+            if distance == 0:
+                return True
+            hit = self.grid.trace(x, y, (tx - x) / distance, (ty - y) / distance, distance, paint, cells)
+            if hit is not None and hit[2] == 2:
+                cells.append(hit[1])
+            return hit is None
+        return self.cached(("visible", paint, source, target), compute)
+
+    def bounce_shots(self, source, target, paint, reach, bounces=SHOT_BOUNCES):
+        # 从source格子中心射出能打到target格子中心的角度，返回[(反弹次数, 飞行的tick数, angle)]，
+        # 按反弹次数、飞行时间从少到多排列；在一整圈的ANGLE_STEPS个角度中搜索。
+        # 打中的角度在穿过的本色墙2被染走时会变；打不中的角度只有挡住它的墙2被染成本色时才可能打中，
+        # 穿过的格子变得能挡住子弹只会让路径更短，仍然打不中
+        def compute(cells):
+            x, y = self.grid.cell_center(source)
+            tx, ty = self.grid.cell_center(target)
+            shots = []
+            for step in range(ANGLE_STEPS):
+                angle = 2 * math.pi * step / ANGLE_STEPS - math.pi
+                passed = []
+                stops = []
+                for count, segment in enumerate(shot_path(self.grid, x, y, angle, paint, bounces, passed, stops)):
+                    tick = segment_hit(segment, tx, ty, reach)
+                    if tick is not None:
+                        shots.append((count, tick, angle))
+                        cells += passed
+                        break
+                else:
+                    cells += stops
+            shots.sort()
+            return shots
+        return self.cached(("bounce", paint, source, target, reach, bounces), compute)
+
+    def best_shot(self, match, shooter, target, bounces=SHOT_BOUNCES):
+        # shooter朝哪个方向射击能打到target：返回(子弹的angle, 反弹次数, 飞行的tick数)，找不到返回None。
+        # 先试直接瞄准；不行时从缓存的反弹角度中按实际位置逐个验证。
+        # 子弹从三角形尾部射出，所以玩家要朝向angle + pi
+        self.sync(match)
+        grid = self.grid
+        paint = OWN_PAINT.get(shooter.color, 0)
+        reach = target_reach(target)
+        angle = math.atan2(target.y - shooter.y, target.x - shooter.x)
+        result = shot_result(grid, shooter.x, shooter.y, angle, paint, target.x, target.y, reach, bounces)
+        if result is not None:
+            return (angle, *result)
+        source = grid.cell_index(shooter.x, shooter.y)
+        cell = grid.cell_index(target.x, target.y)
+        if source < 0 or cell < 0:
+            return None
+        for count, tick, angle in self.bounce_shots(source, cell, paint, reach, bounces):
+            result = shot_result(grid, shooter.x, shooter.y, angle, paint, target.x, target.y, reach, bounces)
+            if result is not None:
+                return (angle, *result)
+        return None
@@ -0,0 +1,103 @@
+# 地图的二进制格式：固定长度的文件头 + 每个格子一个字节。
+# 每个字节的低2位是墙类型，高6位是墙2的颜色编号（见PAINT_COLORS），
+# 编码和解码都在C层按字节批量完成，不创建Wall对象。
+# 地图库文件把成千上万张同样尺寸的地图依次排在一起，通过mmap读取，按下标直接切片
+import mmap
+import struct
+
+from game_core import WallGrid
+
+# 单张地图的文件头：魔数、版本、列数、行数、种子（-1表示没有种子）
+MAP_MAGIC = b"TMAP"
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct("<4sBxHHq")
+
+# 地图库的文件头：魔数、版本、列数、行数、地图数量；之后每条记录都是一张完整的地图
+LIBRARY_MAGIC = b"TMLB"
+LIBRARY_HEADER = struct.Struct("<4sBxHHI")
+
+NO_SEED = -1
+
+# 解码用的查表：从一个字节中取出墙类型和颜色编号
+TYPE_TABLE = bytes(code & 0x3 for code in range(256))
+COLOR_TABLE = bytes(code >> 2 for code in range(256))
+
+
+def encode_grid(grid, seed=None):
+    # 每个格子的类型和颜色编号互不进位，可以当作两个大整数一次性合并
+    n = grid.cols * grid.rows
+    cells = int.from_bytes(grid.types, "little") | (int.from_bytes(grid.colors, "little") << 2)
+    header = MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, grid.cols, grid.rows, NO_SEED if seed is None else seed)
+    return header + cells.to_bytes(n, "little")
+
+
+def decode_grid(data):
+    # data可以是bytes或bytearray，返回(seed, grid)
+    magic, version, cols, rows, seed = MAP_HEADER.unpack_from(data)
+    if magic != MAP_MAGIC or version != MAP_VERSION:
+        raise ValueError("不是支持的地图格式")
+    start = MAP_HEADER.size
+    cells = data[start:start + cols * rows]
+    if len(cells) != cols * rows:
+        raise ValueError("地图数据不完整")
+    cells = bytes(cells)
+    grid = WallGrid.from_cells(cols, rows, cells.translate(TYPE_TABLE), cells.translate(COLOR_TABLE))
+    return (None if seed == NO_SEED else seed), grid
+
+
+def save_map(path, grid, seed=None):
+    with open(path, "wb") as f:
+        f.write(encode_grid(grid, seed))
+
+
+def load_map(path):
+    with open(path, "rb") as f:
+        return decode_grid(f.read())
+
+
+def write_library(path, maps):
+    # maps为(seed, grid)的序列，所有地图尺寸必须相同
+    maps = list(maps)
+    if not maps:
+        raise ValueError("地图库不能为空")
+    cols, rows = maps[0][1].cols, maps[0][1].rows
+    with open(path, "wb") as f:
+        f.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, MAP_VERSION, cols, rows, len(maps)))
+        for seed, grid in maps:
+            if (grid.cols, grid.rows) != (cols, rows):
+                raise ValueError("地图库中的地图尺寸必须相同")
+            f.write(encode_grid(grid, seed))
+
+
+class MapLibrary:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.cols, self.rows, self.count = LIBRARY_HEADER.unpack_from(self.data)
+        if magic != LIBRARY_MAGIC or version != MAP_VERSION:
+            self.close()
+            raise ValueError("不是支持的地图库格式")
+        self.record_size = MAP_HEADER.size + self.cols * self.rows  # 每条记录定长，可以直接按下标定位
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        # 第i张地图的原始字节（只从mmap中复制这一条记录，不读整个文件）
+        if not 0 <= i < self.count:
+            raise IndexError("地图下标超出范围")
+        start = LIBRARY_HEADER.size + i * self.record_size
+        return self.data[start:start + self.record_size]
+
+    def __getitem__(self, i):
+        return decode_grid(self.record(i))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,59 @@
+# 地图预生成池：后台线程提前按种子生成地图，放进有界队列，
+# 重新开局时直接取一张现成的地图，不用在主循环里等待生成。
+# 每张地图都记录种子，用generate_grid(seed)可以原样复现
+import queue
+import random
+import threading
+
+from game_core import Match, generate_grid
+
+
+class MapPool:
+    def __init__(self, size=3, seed=None, arena=None):
+        self.arena = arena  # 地图尺寸(列数, 行数)，None为默认尺寸
+        self.ready = queue.Queue(maxsize=size)  # 生成好的(seed, grid)
+        self.seeds = random.Random(seed)  # 种子序列；给定seed时整个序列可复现
+        self.seed_lock = threading.Lock()
+        self.history = []  # 已经发出去的地图种子，按开局顺序
+        self.running = True
+        self.worker = threading.Thread(target=self.fill, daemon=True)
+        self.worker.start()
+
+    def next_seed(self):
+        with self.seed_lock:
+            return self.seeds.getrandbits(32)
+
+    def generate(self, seed):
+        if self.arena is None:
+            return generate_grid(seed)
+        return generate_grid(seed, *self.arena)
+
+    def fill(self):
+        # 后台线程：队列满时阻塞等待，直到有地图被取走
+        while self.running:
+            seed = self.next_seed()
+            grid = self.generate(seed)
+            while self.running:
+                try:
+                    self.ready.put((seed, grid), timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+
+    def take(self):
+        # 取一张地图，返回(seed, grid)；队列暂时为空时现场生成一张
+        try:
+            seed, grid = self.ready.get_nowait()
+        except queue.Empty:
+            seed = self.next_seed()
+            grid = self.generate(seed)
+        self.history.append(seed)
+        return seed, grid
+
+    def new_match(self, vectorized=False, players=2, teams=None):
+        seed, grid = self.take()
+        return Match(vectorized=vectorized, seed=seed, grid=grid, players=players, teams=teams)
+
+    def close(self):
+        self.running = False
+        self.worker.join()
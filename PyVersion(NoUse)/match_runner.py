@@ -0,0 +1,152 @@
+# 无界面批量对局：用进程池并行跑大量对局，每局由地图种子和电脑玩家决定，
+# 汇总胜率、对局长度、命中、防护罩格挡和墙2变色次数，输出CSV或JSON报告。
+# 例：python match_runner.py --matches 2000 --bots aim random --set BULLET_SPEED=12 --out report.json
+#     python match_runner.py --matches 200 --bots aim aim aim aim --teams 0 0 1 1
+#     python match_runner.py --matches 200 --bots nav aim --arena 80 60
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import game_core
+from game_core import Match, seconds_to_ticks
+from bots import BOTS
+
+# 可以用--set调整的参数（game_core的模块级常量，对之后新建的对局生效）及其单位；
+# 以tick计数的参数在命令行上按秒给出，换算成tick后再设置
+TUNABLE = {"PUSH_BACK_FORCE": "像素/tick", "BULLET_SPEED": "像素/tick", "BULLET_RADIUS": "像素",
+           "BULLET_DAMAGE": "血量", "EXPLOSION_RADIUS": "像素", "MAX_BOUNCES": "次/tick", "ROTATE_SPEED": "弧度/tick",
+           "SHIELD_DURATION": "秒", "SHIELD_COOLDOWN": "秒", "BULLET_GRACE": "秒"}
+TICK_PARAMS = ("SHIELD_DURATION", "SHIELD_COOLDOWN", "BULLET_GRACE")
+
+
+def parse_override(text):
+    name, _, value = text.partition("=")
+    name = name.strip().upper()
+    if name not in TUNABLE:
+        raise argparse.ArgumentTypeError(f"不能调整的参数：{name}，可选：{', '.join(TUNABLE)}")
+    try:
+        number = int(value)
+    except ValueError:
+        try:
+            number = float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"参数值不是数字：{text}")
+    return name, number
+
+
+def apply_overrides(overrides):
+    # 在每个工作进程中调用一次
+    for name, value in overrides:
+        if name in TICK_PARAMS:
+            value = seconds_to_ticks(value)
+        setattr(game_core, name, value)
+
+
+def run_match(job):
+    # 跑一局，返回这一局的统计；job为(seed, bot_names, max_ticks, teams, arena)
+    seed, bot_names, max_ticks, teams, arena = job
+    match = Match(seed=seed, arena=arena, players=len(bot_names), teams=teams)
+    bots = [BOTS[name](seed * len(bot_names) + i) for i, name in enumerate(bot_names)]
+    while match.tick < max_ticks and not match.game_over:
+        for bot, player in zip(bots, match.players):
+            bot.act(match, player)
+        match.step()
+    # 获胜队伍的编号（从1开始，各自一队时即玩家编号），超时为0
+    winner = match.winning_team + 1 if match.game_over else 0
+    row = {"seed": seed, "winner": winner, "ticks": match.tick, "recolors": match.recolors}
+    for i, player in enumerate(match.players):
+        row[f"p{i + 1}_health"] = player.health
+        row[f"p{i + 1}_shots"] = match.shots[i]
+        row[f"p{i + 1}_hits"] = match.hits[i]
+        row[f"p{i + 1}_shield_blocks"] = match.shield_blocks[i]
+    return row
+
+
+def summarize(rows, bot_names, teams=None):
+    n = len(rows)
+    summary = {"matches": n, "bots": list(bot_names),
+               "draws": sum(1 for row in rows if row["winner"] == 0) / n,
+               "mean_ticks": sum(row["ticks"] for row in rows) / n,
+               "mean_seconds": sum(row["ticks"] for row in rows) / n / game_core.TICK_RATE,
+               "mean_recolors": sum(row["recolors"] for row in rows) / n}
+    if teams is not None:
+        summary["teams"] = list(teams)
+        for team in sorted(set(teams)):
+            summary[f"team{team + 1}_win_rate"] = sum(1 for row in rows if row["winner"] == team + 1) / n
+    for i in range(len(bot_names)):
+        key = f"p{i + 1}"
+        if teams is None:
+            summary[f"{key}_win_rate"] = sum(1 for row in rows if row["winner"] == i + 1) / n
+        for stat in ("shots", "hits", "shield_blocks"):
+            summary[f"{key}_mean_{stat}"] = sum(row[f"{key}_{stat}"] for row in rows) / n
+    return summary
+
+
+def write_report(path, rows, summary):
+    # .csv写每局一行，其余写JSON（汇总 + 每局明细）
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as f:
+            json.dump({"summary": summary, "matches": rows}, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行跑无界面对局并汇总统计")
+    parser.add_argument("--matches", type=int, default=1000, help="对局数量")
+    parser.add_argument("--seed", type=int, default=0, help="第一局的地图种子，之后依次加1")
+    parser.add_argument("--bots", nargs="+", default=["aim", "aim"], choices=sorted(BOTS),
+                        help="每名玩家使用的电脑玩家（2~16名）")
+    parser.add_argument("--teams", type=int, nargs="+", help="按玩家顺序的队伍编号，如0 0 1 1；不指定时各自一队")
+    parser.add_argument("--arena", type=int, nargs=2, metavar=("COLS", "ROWS"), help="地图尺寸（格子数），默认和窗口一样大")
+    parser.add_argument("--max-seconds", type=float, default=120, help="每局最长时间，超时记为平局")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="进程数")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], type=parse_override,
+                        metavar="NAME=VALUE",
+                        help="调整game_core中的参数，可以重复；可选参数及单位：" +
+                             "，".join(f"{name}（{unit}）" for name, unit in TUNABLE.items()))
+    parser.add_argument("--out", help="报告文件，.csv或.json")
+    args = parser.parse_args(argv)
+    if args.matches < 1:
+        parser.error("--matches至少为1")
+    if not 2 <= len(args.bots) <= game_core.MAX_PLAYERS:
+        parser.error(f"--bots需要2~{game_core.MAX_PLAYERS}个")
+    if args.teams is not None and len(args.teams) != len(args.bots):
+        parser.error("--teams的数量必须与--bots相同")
+    if args.teams is not None and not all(0 <= team < game_core.MAX_TEAMS for team in args.teams):
+        parser.error(f"队伍编号需要在0~{game_core.MAX_TEAMS - 1}之间")
+    if args.teams is not None and len(set(args.teams)) < 2:
+        parser.error("--teams至少需要两支不同的队伍")
+
+    max_ticks = seconds_to_ticks(args.max_seconds)
+    teams = tuple(args.teams) if args.teams is not None else None
+    arena = tuple(args.arena) if args.arena is not None else None
+    jobs = [(args.seed + i, tuple(args.bots), max_ticks, teams, arena) for i in range(args.matches)]
+    start = time.perf_counter()
+    # 每个进程分到多局一起跑，减少进程间通信
+    chunksize = max(1, len(jobs) // (args.workers * 8))
+    with ProcessPoolExecutor(args.workers, initializer=apply_overrides, initargs=(args.overrides,)) as pool:
+        rows = list(pool.map(run_match, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(rows, args.bots, teams)
+    if arena is not None:
+        summary["arena"] = list(arena)
+    summary["overrides"] = dict(args.overrides)
+    summary["workers"] = args.workers
+    summary["wall_seconds"] = round(elapsed, 3)
+    summary["matches_per_second"] = round(len(rows) / elapsed, 1)
+    summary["speedup_vs_real_time"] = round(sum(row["ticks"] for row in rows) / game_core.TICK_RATE / elapsed, 1)
+    if args.out:
+        write_report(args.out, rows, summary)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
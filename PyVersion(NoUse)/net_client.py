@@ -0,0 +1,142 @@
+# 联机客户端：连接服务器、上传输入，把收到的差分快照还原成完整状态。
+# 地图不经过网络传输，客户端用服务器给的种子自己生成，之后只同步变色的墙2。
+# 例（本机测试）：先启动net_server.py，再运行两个python net_client.py --room test，随机输入10秒
+import argparse
+import asyncio
+import random
+import time
+
+from game_core import generate_grid
+from replay import FIRE, SHIELD_ON, SHIELD_OFF, TURN_LEFT, TURN_RIGHT
+from net_protocol import (MSG_JOIN, MSG_WELCOME, MSG_SNAPSHOT, MSG_ERROR, MSG_ACK, WELCOME, ACK, NO_BASE,
+                          SNAPSHOT_HEADER, BULLET_SCALE, frame, read_frame, encode_input, decode_snapshot)
+
+HISTORY_SIZE = 64  # 客户端保留多少个快照作为差分基准，与服务器的HISTORY_TICKS一致
+
+
+class GameClient:
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.index = None  # 自己的玩家下标
+        self.teams = []  # 每名玩家的队伍编号
+        self.seed = None
+        self.match_id = None
+        self.grid = None  # 按种子生成的地图，colors随快照更新
+        self.tick = 0
+        self.game_over = False
+        self.winner = None  # 胜者的队伍编号
+        self.players = []  # 每个玩家的(x, y, angle, health, shield, shield_remaining, shield_cooldown)
+        self.bullets = {}  # 子弹编号 -> (x, y, 发射者下标)，坐标单位为1/BULLET_SCALE像素
+        self.history = {}  # tick -> (players, bullets)，作为服务器差分的基准
+        self.bytes_received = 0
+        self.snapshots = 0
+        self.started = asyncio.Event()
+
+    async def connect(self, host, port, room):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(frame(MSG_JOIN, room.encode("utf-8")))
+
+    def send_input(self, op, value=None):
+        self.writer.write(encode_input(op, value))
+
+    def bullet_positions(self):
+        # 子弹的像素坐标和发射者
+        return [(x / BULLET_SCALE, y / BULLET_SCALE, owner) for x, y, owner in self.bullets.values()]
+
+    async def run(self):
+        # 接收并处理服务器消息，直到连接关闭
+        try:
+            while True:
+                msg_type, payload = await read_frame(self.reader)
+                self.bytes_received += len(payload) + 5
+                if msg_type == MSG_WELCOME:
+                    self.on_welcome(payload)
+                elif msg_type == MSG_SNAPSHOT:
+                    self.on_snapshot(payload)
+                elif msg_type == MSG_ERROR:
+                    raise ConnectionError(payload.decode("utf-8", "replace"))
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+
+    def on_welcome(self, payload):
+        self.index, self.seed, cols, rows, self.match_id, tick_rate = WELCOME.unpack_from(payload)
+        self.teams = list(payload[WELCOME.size:])
+        self.grid = generate_grid(self.seed, cols, rows)
+        self.tick = 0
+        self.game_over = False
+        self.winner = None
+        self.players = []
+        self.bullets = {}
+        self.history = {}
+        self.started.set()
+
+    def on_snapshot(self, payload):
+        base_tick = SNAPSHOT_HEADER.unpack_from(payload)[2]
+        base = self.history.get(base_tick) if base_tick != NO_BASE else None
+        if base_tick != NO_BASE and base is None:
+            return  # 基准已经丢弃，等服务器发完整快照
+        match_id, tick, base_tick, status, players, bullets, cells = decode_snapshot(payload, base)
+        if match_id != self.match_id or tick <= self.tick and self.players:
+            return
+        self.tick = tick
+        self.players = players
+        self.bullets = bullets
+        for index, code in cells:
+            self.grid.colors[index] = code
+            self.grid.dirty.add(index)
+        self.game_over = bool(status & 1)
+        self.winner = (status >> 1) - 1 if self.game_over else None
+        self.history[tick] = (players, bullets)
+        # 快照间隔大于1时tick不连续，删掉所有超出HISTORY_SIZE的记录
+        for old in [t for t in self.history if t <= tick - HISTORY_SIZE]:
+            del self.history[old]
+        self.snapshots += 1
+        self.writer.write(frame(MSG_ACK, ACK.pack(match_id, tick)))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def random_inputs(client, seconds, rng):
+    # 本机测试用：随机转向、射击和开关防护罩
+    await client.started.wait()
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        roll = rng.random()
+        if roll < 0.05:
+            client.send_input(FIRE)
+        elif roll < 0.07:
+            client.send_input(SHIELD_ON)
+        elif roll < 0.09:
+            client.send_input(SHIELD_OFF)
+        elif roll < 0.5:
+            client.send_input(TURN_LEFT if roll < 0.3 else TURN_RIGHT)
+        await asyncio.sleep(1 / 30)
+
+
+async def demo(host, port, room, seconds, seed):
+    client = GameClient()
+    await client.connect(host, port, room)
+    receiver = asyncio.create_task(client.run())
+    await random_inputs(client, seconds, random.Random(seed))
+    await client.close()
+    await receiver
+    print(f"player {client.index} tick {client.tick} snapshots {client.snapshots} "
+          f"received {client.bytes_received} bytes ({client.bytes_received / seconds:.0f} B/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="联机客户端（无界面测试）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--room", default="test")
+    parser.add_argument("--seconds", type=float, default=10, help="随机输入持续的时间")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    asyncio.run(demo(args.host, args.port, args.room, args.seconds, args.seed))
+
+
+if __name__ == "__main__":
+    main()
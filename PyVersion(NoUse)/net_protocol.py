@@ -0,0 +1,225 @@
+# 联机协议：服务器和客户端共用的消息格式。
+# 每条消息为：长度(u32) + 类型(u8) + 内容。客户端只发送输入（指令与录像相同，见replay.py）和确认，
+# 服务器发送快照：相对客户端最后确认的状态做差分，只包含变化的玩家字段、新增/移动/消失的子弹和变色的墙2
+import math
+import struct
+
+from replay import FIRE, SHIELD_ON, SHIELD_OFF, TURN_LEFT, TURN_RIGHT, SET_ANGLE
+
+# 客户端 -> 服务器
+MSG_JOIN = 1  # 房间名（utf-8）
+MSG_INPUT = 2  # 指令(u8)，SET_ANGLE附带一个double
+MSG_ACK = 3  # 已收到的快照：对局编号(u32)、tick(u32)
+
+# 服务器 -> 客户端
+MSG_WELCOME = 16  # 新的一局开始：玩家下标、地图种子等，客户端用generate_grid(seed)生成同样的地图
+MSG_SNAPSHOT = 17
+MSG_ERROR = 18  # 错误信息（utf-8），之后连接会被关闭
+
+INPUT_OPS = (FIRE, SHIELD_ON, SHIELD_OFF, TURN_LEFT, TURN_RIGHT, SET_ANGLE)
+
+FRAME_HEADER = struct.Struct("<IB")
+WELCOME = struct.Struct("<BqHHIH")  # 玩家下标、种子、地图列数和行数、对局编号、tick频率；之后每名玩家的队伍编号各一个字节
+SNAPSHOT_HEADER = struct.Struct("<IIIB")  # 对局编号、tick、基准tick、状态（game_over | 胜者队伍编号+1 << 1）
+ANGLE = struct.Struct("<d")
+ACK = struct.Struct("<II")
+NO_BASE = 0xFFFFFFFF  # 基准tick为它时表示完整快照
+
+# 玩家字段：(名称, 格式)，变化掩码中的第i位对应第i个字段
+PLAYER_FIELDS = (("x", struct.Struct("<f")), ("y", struct.Struct("<f")), ("angle", struct.Struct("<f")),
+                 ("health", struct.Struct("<h")), ("shield", struct.Struct("<B")),
+                 ("shield_remaining", struct.Struct("<H")), ("shield_cooldown", struct.Struct("<H")))
+FLOAT32 = struct.Struct("<f")
+BULLET_POS = struct.Struct("<hh")  # 子弹坐标以1/4像素为单位
+BULLET_SCALE = 4
+
+
+def frame(msg_type, payload=b""):
+    return FRAME_HEADER.pack(len(payload) + 1, msg_type) + payload
+
+
+async def read_frame(reader):
+    # 读一条消息，返回(类型, 内容)；连接关闭时抛出asyncio.IncompleteReadError
+    length, msg_type = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return msg_type, await reader.readexactly(length - 1)
+
+
+def encode_input(op, value=None):
+    if op == SET_ANGLE:
+        return frame(MSG_INPUT, bytes((op,)) + ANGLE.pack(value))
+    return frame(MSG_INPUT, bytes((op,)))
+
+
+def decode_input(payload):
+    # 返回(op, value)，格式不对时返回None
+    if not payload or payload[0] not in INPUT_OPS:
+        return None
+    op = payload[0]
+    if op == SET_ANGLE:
+        if len(payload) != 1 + ANGLE.size:
+            return None
+        value = ANGLE.unpack_from(payload, 1)[0]
+        if not math.isfinite(value):
+            return None
+        return op, value
+    return op, None
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+
+def quantize(value):
+    # 按float32取整，保证比较变化时和客户端收到的值一致
+    return FLOAT32.unpack(FLOAT32.pack(value))[0]
+
+
+def player_state(player):
+    return (quantize(player.x), quantize(player.y), quantize(player.angle), player.health,
+            player.shield_active | player.shield_button_pressed << 1,
+            player.shield_remaining, player.shield_cooldown)
+
+
+def bullet_states(match):
+    # 返回{子弹编号: (x, y, 发射者下标)}，坐标已量化
+    states = {}
+    if match.vectorized:
+        bullets = match.bullets
+        n = bullets.count
+        for serial, x, y, owner in zip(bullets.serial[:n].tolist(), bullets.x[:n].tolist(),
+                                       bullets.y[:n].tolist(), bullets.owner[:n].tolist()):
+            states[serial] = (round(x * BULLET_SCALE), round(y * BULLET_SCALE), owner)
+    else:
+        for bullet in match.bullets:
+            states[bullet.serial] = (round(bullet.x * BULLET_SCALE), round(bullet.y * BULLET_SCALE),
+                                     match.players.index(bullet.owner))
+    return states
+
+
+class StateRecord:
+    # 某个tick的可差分状态：玩家字段、子弹和本tick变色的格子
+    def __init__(self, match):
+        self.tick = match.tick
+        self.players = [player_state(player) for player in match.players]
+        self.bullets = bullet_states(match)
+        self.recolored = match.recolored
+        self.status = 0
+        if match.game_over:
+            self.status = 1 | (match.winning_team + 1) << 1
+
+
+def encode_snapshot(match_id, record, base, cells):
+    # base为客户端确认过的StateRecord（None表示发送完整快照），cells为[(格子下标, 颜色编号)]
+    out = bytearray(SNAPSHOT_HEADER.pack(match_id, record.tick, NO_BASE if base is None else base.tick, record.status))
+
+    # 玩家：每人一个变化掩码，后面依次是变化的字段
+    out.append(len(record.players))
+    for i, state in enumerate(record.players):
+        old = base.players[i] if base is not None else None
+        mask = 0
+        for bit, value in enumerate(state):
+            if old is None or old[bit] != value:
+                mask |= 1 << bit
+        out.append(mask)
+        for bit, (name, fmt) in enumerate(PLAYER_FIELDS):
+            if mask & (1 << bit):
+                out += fmt.pack(state[bit])
+
+    # 子弹：消失的、新增的（带发射者）、移动过的
+    old_bullets = base.bullets if base is not None else {}
+    removed = [serial for serial in old_bullets if serial not in record.bullets]
+    added = []
+    moved = []
+    for serial, state in record.bullets.items():
+        old = old_bullets.get(serial)
+        if old is None:
+            added.append(serial)
+        elif old[:2] != state[:2]:
+            moved.append(serial)
+    write_varint(out, len(removed))
+    for serial in removed:
+        write_varint(out, serial)
+    write_varint(out, len(added))
+    for serial in added:
+        x, y, owner = record.bullets[serial]
+        write_varint(out, serial)
+        out += BULLET_POS.pack(x, y)
+        out.append(owner)
+    write_varint(out, len(moved))
+    for serial in moved:
+        x, y, owner = record.bullets[serial]
+        write_varint(out, serial)
+        out += BULLET_POS.pack(x, y)
+
+    # 变色的墙2：下标增量 + 颜色编号
+    write_varint(out, len(cells))
+    last = 0
+    for index, code in cells:
+        write_varint(out, index - last)
+        last = index
+        out.append(code)
+    return frame(MSG_SNAPSHOT, bytes(out))
+
+
+def decode_snapshot(payload, base):
+    # base为客户端保存的基准状态（ClientState.history中的(players, bullets)），返回
+    # (match_id, tick, base_tick, status, players, bullets, cells)
+    match_id, tick, base_tick, status = SNAPSHOT_HEADER.unpack_from(payload)
+    pos = SNAPSHOT_HEADER.size
+    base_players, base_bullets = base if base is not None else (None, {})
+
+    count = payload[pos]
+    pos += 1
+    players = []
+    for i in range(count):
+        mask = payload[pos]
+        pos += 1
+        state = list(base_players[i]) if base_players is not None else [0] * len(PLAYER_FIELDS)
+        for bit, (name, fmt) in enumerate(PLAYER_FIELDS):
+            if mask & (1 << bit):
+                state[bit] = fmt.unpack_from(payload, pos)[0]
+                pos += fmt.size
+        players.append(tuple(state))
+
+    bullets = dict(base_bullets)
+    n, pos = read_varint(payload, pos)
+    for _ in range(n):
+        serial, pos = read_varint(payload, pos)
+        bullets.pop(serial, None)
+    n, pos = read_varint(payload, pos)
+    for _ in range(n):
+        serial, pos = read_varint(payload, pos)
+        x, y = BULLET_POS.unpack_from(payload, pos)
+        bullets[serial] = (x, y, payload[pos + BULLET_POS.size])
+        pos += BULLET_POS.size + 1
+    n, pos = read_varint(payload, pos)
+    for _ in range(n):
+        serial, pos = read_varint(payload, pos)
+        x, y = BULLET_POS.unpack_from(payload, pos)
+        pos += BULLET_POS.size
+        bullets[serial] = (x, y, bullets[serial][2])
+
+    cells = []
+    n, pos = read_varint(payload, pos)
+    index = 0
+    for _ in range(n):
+        delta, pos = read_varint(payload, pos)
+        index += delta
+        cells.append((index, payload[pos]))
+        pos += 1
+    return match_id, tick, base_tick, status, players, bullets, cells
@@ -0,0 +1,254 @@
+# 权威服务器：一个asyncio进程里同时运行多个房间，模拟全部在服务器上进行，
+# 客户端只上传输入，服务器每个tick把相对客户端最后确认状态的差分快照发回去。
+# 所有房间共用一个tick循环；发送缓冲积压的客户端跳过快照，等它追上后再按最后确认的状态补发差分。
+# 例：python net_server.py --port 8765
+import argparse
+import asyncio
+import os
+import struct
+import time
+
+from game_core import MAX_PLAYERS, MAX_TEAMS, TICK_RATE, TICK_SECONDS, seconds_to_ticks
+from map_pool import MapPool
+from replay import InputRecorder, SET_ANGLE
+from net_protocol import (MSG_JOIN, MSG_INPUT, MSG_ACK, MSG_WELCOME, MSG_ERROR, WELCOME, ACK, StateRecord,
+                          frame, read_frame, decode_input, encode_snapshot)
+
+HISTORY_TICKS = 64  # 保留多少个tick的状态作为差分基准，确认更旧的客户端收到完整快照
+RESTART_TICKS = seconds_to_ticks(3)  # 一局结束后多久开始下一局
+SEND_BUFFER_LIMIT = 64 * 1024  # 发送缓冲超过这个大小时暂停给该客户端发快照
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.room = None
+        self.index = None  # 在房间中的玩家下标
+        self.acked = None  # 最后确认的快照tick（当前这一局）
+        self.bytes_sent = 0
+
+    def send(self, data):
+        self.writer.write(data)
+        self.bytes_sent += len(data)
+
+
+class Room:
+    def __init__(self, name, server):
+        self.name = name
+        self.server = server
+        self.clients = [None] * server.players  # 按玩家下标排列，人到齐才开局
+        self.match = None
+        self.match_id = 0
+        self.pending = {}  # 玩家下标 -> 本tick要执行的输入[(op, value)]，每种指令最多一条
+        self.history = {}  # tick -> StateRecord
+        self.over_ticks = 0  # 对局结束后经过的tick数
+
+    def is_full(self):
+        return None not in self.clients
+
+    def is_empty(self):
+        return all(client is None for client in self.clients)
+
+    def start_match(self):
+        self.save_replay()
+        self.match = self.server.maps.new_match(players=self.server.players, teams=self.server.teams)
+        self.match_id += 1
+        self.recorder = InputRecorder(self.match.seed, (self.match.grid.cols, self.match.grid.rows), self.match.teams)
+        self.initial_colors = bytes(self.match.grid.colors)
+        self.pending = {}
+        self.history = {0: StateRecord(self.match)}
+        self.over_ticks = 0
+        for client in self.clients:
+            if client is not None:
+                self.welcome(client)
+
+    def welcome(self, client):
+        client.acked = None
+        grid = self.match.grid
+        client.send(frame(MSG_WELCOME, WELCOME.pack(client.index, self.match.seed, grid.cols, grid.rows,
+                                                     self.match_id, TICK_RATE) + bytes(self.match.teams)))
+
+    def queue_input(self, index, op, value):
+        # 一个tick内合并同一名玩家的输入：SET_ANGLE只保留最后的朝向，其余指令（射击、转向、防护罩）重复的丢弃，
+        # 客户端发得再快，每个tick每人每种指令也只执行一条
+        inputs = self.pending.setdefault(index, [])
+        for i, (pending_op, _) in enumerate(inputs):
+            if pending_op == op:
+                if op != SET_ANGLE:
+                    return
+                del inputs[i]
+                break
+        inputs.append((op, value))
+
+    def save_replay(self):
+        if self.match is not None and self.server.replay_dir is not None:
+            self.recorder.finish(self.match)
+            os.makedirs(self.server.replay_dir, exist_ok=True)
+            name = f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{self.match.seed}.trpl"
+            self.recorder.save(os.path.join(self.server.replay_dir, name))
+
+    def step(self):
+        # 人没到齐时不推进
+        if self.match is None or not self.is_full():
+            return
+        match = self.match
+        if match.game_over:
+            self.over_ticks += 1
+            if self.over_ticks >= RESTART_TICKS:
+                self.start_match()
+                return
+        for index in sorted(self.pending):
+            for op, value in self.pending[index]:
+                self.recorder.send(match, index, op, value)
+        self.pending = {}
+        match.step()
+        record = StateRecord(match)
+        self.history[match.tick] = record
+        self.history.pop(match.tick - HISTORY_TICKS, None)
+        if match.tick % self.server.snapshot_interval == 0:
+            for client in self.clients:
+                if client is not None:
+                    self.send_snapshot(client, record)
+
+    def send_snapshot(self, client, record):
+        if client.writer.transport.get_write_buffer_size() > SEND_BUFFER_LIMIT:
+            return
+        base = self.history.get(client.acked) if client.acked is not None else None
+        colors = self.match.grid.colors
+        if base is None:
+            # 完整快照：客户端按种子生成的初始地图，加上所有颜色不同的格子
+            initial = self.initial_colors
+            cells = [(index, colors[index]) for index in range(len(colors)) if colors[index] != initial[index]]
+        else:
+            changed = set()
+            for tick in range(base.tick + 1, record.tick + 1):
+                changed |= self.history[tick].recolored
+            cells = [(index, colors[index]) for index in sorted(changed)]
+        client.send(encode_snapshot(self.match_id, record, base, cells))
+
+
+class GameServer:
+    def __init__(self, snapshot_interval=1, replay_dir=None, seed=None, arena=None, players=2, teams=None):
+        self.rooms = {}
+        self.players = len(teams) if teams is not None else players  # 每个房间的人数
+        self.teams = teams  # 每名玩家的队伍编号，None为各自一队
+        self.snapshot_interval = snapshot_interval  # 每几个tick发一次快照
+        self.replay_dir = replay_dir  # 不为None时保存每局的录像
+        self.maps = MapPool(seed=seed, arena=arena)
+        self.server = None
+        self.tick_task = None
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.tick_task = asyncio.get_running_loop().create_task(self.tick_loop())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.tick_task.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+        for room in self.rooms.values():
+            room.save_replay()
+        self.maps.close()
+
+    async def tick_loop(self):
+        # 所有房间共用一个固定步长的循环；落后时不等待，连续补齐，落后超过5个tick时放弃追赶
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while True:
+            for room in list(self.rooms.values()):
+                room.step()
+            next_time += TICK_SECONDS
+            delay = next_time - loop.time()
+            if delay < -5 * TICK_SECONDS:
+                next_time = loop.time()
+            await asyncio.sleep(max(0, delay))
+
+    def join(self, client, name):
+        room = self.rooms.get(name)
+        if room is None:
+            room = self.rooms[name] = Room(name, self)
+        if room.is_full():
+            return False
+        client.room = room
+        client.index = room.clients.index(None)
+        room.clients[client.index] = client
+        if room.is_full():
+            room.start_match()
+        return True
+
+    def leave(self, client):
+        room = client.room
+        if room is None:
+            return
+        room.clients[client.index] = None
+        if room.is_empty():
+            room.save_replay()
+            del self.rooms[room.name]
+        client.room = None
+
+    async def handle_client(self, reader, writer):
+        client = Client(reader, writer)
+        try:
+            while True:
+                msg_type, payload = await read_frame(reader)
+                if msg_type == MSG_JOIN and client.room is None:
+                    if not self.join(client, payload.decode("utf-8", "replace")):
+                        client.send(frame(MSG_ERROR, "房间已满".encode("utf-8")))
+                        break
+                elif msg_type == MSG_INPUT and client.room is not None:
+                    command = decode_input(payload)
+                    if command is not None:
+                        client.room.queue_input(client.index, command[0], command[1])
+                elif msg_type == MSG_ACK and client.room is not None:
+                    match_id, tick = ACK.unpack(payload)
+                    # 忽略上一局的确认
+                    if match_id == client.room.match_id and (client.acked is None or tick > client.acked):
+                        client.acked = tick
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error):
+            pass
+        finally:
+            self.leave(client)
+            writer.close()
+
+
+async def serve(host, port, snapshot_interval, replay_dir, players, teams):
+    server = GameServer(snapshot_interval, replay_dir, players=players, teams=teams)
+    port = await server.start(host, port)
+    print(f"listening on {host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多房间权威游戏服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--snapshot-interval", type=int, default=1, help="每几个tick发送一次快照")
+    parser.add_argument("--replay-dir", help="保存每局录像的目录")
+    parser.add_argument("--players", type=int, help="每个房间的人数（2~16），默认2，指定--teams时为队伍编号的个数")
+    parser.add_argument("--teams", type=int, nargs="+", help="按玩家顺序的队伍编号，如0 0 1 1；不指定时各自一队")
+    args = parser.parse_args(argv)
+    if args.snapshot_interval < 1:
+        parser.error("--snapshot-interval至少为1")
+    if args.teams is not None:
+        if args.players is not None and len(args.teams) != args.players:
+            parser.error("--teams的数量必须与--players相同")
+        if not all(0 <= team < MAX_TEAMS for team in args.teams):
+            parser.error(f"队伍编号需要在0~{MAX_TEAMS - 1}之间")
+        if len(set(args.teams)) < 2:
+            parser.error("--teams至少需要两支不同的队伍")
+    players = len(args.teams) if args.teams is not None else args.players or 2
+    if not 2 <= players <= MAX_PLAYERS:
+        parser.error(f"每个房间需要2~{MAX_PLAYERS}名玩家")
+    try:
+        asyncio.run(serve(args.host, args.port, args.snapshot_interval, args.replay_dir, players, args.teams))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
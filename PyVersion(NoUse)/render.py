@@ -0,0 +1,463 @@
+# 渲染层：把game_core中的对局状态画到pygame的Surface上。
+# 绘制函数都返回画过的区域（Rect或Rect列表），供脏矩形渲染使用
+import itertools
+import math
+from collections import deque, OrderedDict
+
+import pygame
+
+import game_core
+from game_core import (WALL_SIZE, PAINT_COLORS, OWN_PAINT, TRAIL_COLORS, WHITE, BLACK,
+                       GRAY, DARK_GRAY, LIGHT_GRAY)
+from line_of_sight import shot_path, segment_hit, target_reach
+
+# 字体大小
+FONT_SIZE = 48  # 血量、按钮和胜利信息
+STATUS_FONT_SIZE = 32  # 防护罩状态
+
+
+# 摄像机：把地图上viewport大小的一块显示到屏幕的viewport区域，地图可以比窗口大。
+# 视野之外的墙、轨迹、子弹和玩家都不画，每帧的绘制量只和看得见的部分有关
+class Camera:
+    def __init__(self, viewport, world_width, world_height):
+        self.viewport = pygame.Rect(viewport)  # 屏幕上的显示区域
+        self.world_width = world_width
+        self.world_height = world_height
+        self.x = 0  # 视野左上角的地图坐标
+        self.y = 0
+
+    def follow(self, x, y):
+        # 让(x, y)位于视野中央，视野不超出地图；地图比视野小时居中显示
+        width, height = self.viewport.size
+        if self.world_width <= width:
+            self.x = (self.world_width - width) // 2
+        else:
+            self.x = min(max(0, int(x) - width // 2), self.world_width - width)
+        if self.world_height <= height:
+            self.y = (self.world_height - height) // 2
+        else:
+            self.y = min(max(0, int(y) - height // 2), self.world_height - height)
+
+    def world_rect(self):
+        return pygame.Rect(self.x, self.y, self.viewport.width, self.viewport.height)
+
+    def offset(self):
+        # 地图坐标加上它就是屏幕坐标
+        return self.viewport.x - self.x, self.viewport.y - self.y
+
+    def visible(self, x, y, margin=0):
+        return (self.x - margin <= x < self.x + self.viewport.width + margin and
+                self.y - margin <= y < self.y + self.viewport.height + margin)
+
+    def blit_layer(self, surface, layer):
+        # 把和地图一样大的图层中视野内的部分画到视口里（地图比视野小时视野坐标为负，要先裁掉）
+        area = self.world_rect().clip(layer.get_rect())
+        offset_x, offset_y = self.offset()
+        return surface.blit(layer, (area.x + offset_x, area.y + offset_y), area)
+
+
+# 玩家精灵缓存：每种颜色预先画好angle_steps个等分角度的三角形（含绿色方向指示），
+# 以及alpha_steps级透明度的防护罩圆环。绘制时只需一到两次blit，不做三角函数计算，也不创建Surface
+class SpriteCache:
+    COLORKEY = (255, 0, 255)  # 精灵用色键透明并做RLE压缩，blit比逐像素alpha快
+
+    def __init__(self, angle_steps=72, alpha_steps=16):
+        self.angle_steps = angle_steps
+        self.alpha_steps = alpha_steps
+        self.triangles = {}  # (颜色, 大小) -> 各角度的精灵列表
+        self.shields = {}  # (颜色, 半径) -> 各透明度级别的圆环列表
+
+    def new_surface(self, size):
+        sprite = pygame.Surface((size, size))
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        sprite.fill(self.COLORKEY)
+        return sprite
+
+    def finish(self, sprite, alpha=None):
+        sprite.set_colorkey(self.COLORKEY, pygame.RLEACCEL)
+        if alpha is not None:
+            sprite.set_alpha(alpha, pygame.RLEACCEL)
+        return sprite
+
+    def triangle_sprites(self, color, size):
+        key = (color, size)
+        sprites = self.triangles.get(key)
+        if sprites is None:
+            half = size + 8  # 三角形加方向指示点的最大半径
+            sprites = []
+            for step in range(self.angle_steps):
+                angle = 2 * math.pi * step / self.angle_steps
+                sprite = self.new_surface(half * 2 + 1)
+                points = [(half + math.cos(angle + k * 2 * math.pi / 3) * size,
+                           half + math.sin(angle + k * 2 * math.pi / 3) * size) for k in range(3)]
+                pygame.draw.polygon(sprite, color, points)
+                direction_point = (int(half + math.cos(angle) * (size + 5)), int(half + math.sin(angle) * (size + 5)))
+                pygame.draw.circle(sprite, (0, 255, 0), direction_point, 3)
+                sprites.append(self.finish(sprite))
+            self.triangles[key] = sprites
+        return sprites
+
+    def shield_sprites(self, color, radius):
+        key = (color, radius)
+        sprites = self.shields.get(key)
+        if sprites is None:
+            sprites = []
+            for level in range(self.alpha_steps + 1):
+                sprite = self.new_surface(radius * 2)
+                pygame.draw.circle(sprite, color, (radius, radius), radius, 2)
+                sprites.append(self.finish(sprite, 255 * level // self.alpha_steps))
+            self.shields[key] = sprites
+        return sprites
+
+    def draw_player(self, surface, player, camera=None):
+        # camera不为None时按摄像机偏移绘制，视野外的玩家不画（返回None）
+        dx, dy = 0, 0
+        if camera is not None:
+            if not camera.visible(player.x, player.y, player.shield_radius + 8):
+                return None
+            dx, dy = camera.offset()
+        sprites = self.triangle_sprites(player.color, player.size)
+        step = round(player.angle / (2 * math.pi) * self.angle_steps) % self.angle_steps
+        half = player.size + 8
+        rect = surface.blit(sprites[step], (int(player.x) - half + dx, int(player.y) - half + dy))
+
+        # 绘制防护罩（透明度随剩余时间降低）
+        if player.is_shield_active():
+            level = min(self.alpha_steps, round(self.alpha_steps * player.shield_remaining / player.shield_duration))
+            ring = self.shield_sprites(player.color, player.shield_radius)[level]
+            rect.union_ip(surface.blit(ring, (player.x - player.shield_radius + dx,
+                                              player.y - player.shield_radius + dy)))
+        return rect
+
+
+def draw_bullet(surface, bullet, camera=None):
+    # 绘制子弹；有摄像机时视野外的子弹不画（返回None）
+    if camera is None:
+        return pygame.draw.circle(surface, bullet.color, (int(bullet.x), int(bullet.y)), bullet.radius)
+    if not camera.visible(bullet.x, bullet.y, bullet.radius):
+        return None
+    dx, dy = camera.offset()
+    return pygame.draw.circle(surface, bullet.color, (int(bullet.x) + dx, int(bullet.y) + dy), bullet.radius)
+
+
+def draw_bullet_array(surface, match, camera=None):
+    # 绘制向量化子弹系统中的子弹；有摄像机时先批量筛出视野内的子弹
+    bullets = match.bullets
+    rects = []
+    n = bullets.count
+    dx, dy = 0, 0
+    if camera is None:
+        indices = range(n)
+    else:
+        dx, dy = camera.offset()
+        view = camera.world_rect().inflate(game_core.BULLET_RADIUS * 2, game_core.BULLET_RADIUS * 2)
+        x = bullets.x[:n]
+        y = bullets.y[:n]
+        indices = ((x >= view.left) & (x < view.right) & (y >= view.top) & (y < view.bottom)).nonzero()[0]
+    for i in indices:
+        color = match.players[bullets.owner[i]].color
+        rects.append(pygame.draw.circle(surface, color, (int(bullets.x[i]) + dx, int(bullets.y[i]) + dy), game_core.BULLET_RADIUS))
+    return rects
+
+
+def iter_bullet_paths(match):
+    # 依次返回每颗子弹的(标识, 本tick经过的点, 轨迹颜色)
+    if match.vectorized:
+        bullets = match.bullets
+        for i in range(bullets.count):
+            yield int(bullets.serial[i]), bullets.path(i), bullets.trail_color(match, i)
+    else:
+        for bullet in match.bullets:
+            yield bullet, bullet.path, bullet.trail_color
+
+
+# 子弹轨迹：每帧的绘制量与子弹存在的时间无关
+# persistent：每个tick只把最新一段轨迹画到effect_surface上，之前的轨迹已经留在上面
+# fading：每颗子弹只保留最近length个点的环形缓冲，逐帧画在屏幕上，尾部逐渐变细，不留痕迹
+class TrailRenderer:
+    def __init__(self, mode="persistent", length=12):
+        self.mode = mode
+        self.length = length
+        self.buffers = {}  # 子弹标识 -> 最近轨迹点的deque
+
+    def clear(self):
+        self.buffers = {}
+
+    def stamp(self, effect_surface, match):
+        # 每个tick模拟后调用，返回effect_surface上变化的区域；
+        # persistent模式下本tick消失的子弹也补画最后一段，轨迹一直连到爆炸点
+        rects = []
+        if self.mode == "persistent":
+            for _, path, color in itertools.chain(iter_bullet_paths(match), match.removed):
+                if len(path) >= 2 and path[0] != path[-1]:
+                    rects.append(pygame.draw.lines(effect_surface, color, False, path, game_core.BULLET_RADIUS * 2))
+        else:
+            buffers = {}
+            for key, path, color in iter_bullet_paths(match):
+                points = self.buffers.get(key)
+                if points is None:
+                    if not path:
+                        continue  # 还没移动过的子弹
+                    points = deque(path[:1], maxlen=self.length)
+                points.extend(path[1:])
+                buffers[key] = points
+            self.buffers = buffers  # 已消失子弹的缓冲随之丢弃
+        return rects
+
+    def draw(self, surface, match, camera=None):
+        # 每帧调用，只有fading模式需要绘制；有摄像机时跳过最新点不在视野附近的轨迹
+        rects = []
+        if self.mode == "persistent":
+            return rects
+        dx, dy = camera.offset() if camera is not None else (0, 0)
+        margin = self.length * game_core.BULLET_SPEED  # 轨迹大约是最近length个tick的位移
+        for key, _, color in iter_bullet_paths(match):
+            points = self.buffers.get(key)
+            if points is None or len(points) < 2:
+                continue
+            if camera is not None and not camera.visible(points[-1][0], points[-1][1], margin):
+                continue
+            count = len(points) - 1
+            for k in range(count):
+                width = max(1, game_core.BULLET_RADIUS * 2 * (k + 1) // count)
+                start = (points[k][0] + dx, points[k][1] + dy)
+                end = (points[k + 1][0] + dx, points[k + 1][1] + dy)
+                rects.append(pygame.draw.line(surface, color, start, end, width))
+        return rects
+
+
+def draw_aim_line(surface, match, player, camera=None):
+    # 辅助瞄准：画出玩家现在射击时子弹的路线（含墙3反弹），能打到敌人时在路线终点画圈。
+    # 子弹从三角形尾部射出，方向是player.angle + pi
+    segments = shot_path(match.grid, player.x, player.y, player.angle + math.pi, OWN_PAINT.get(player.color, 0))
+    hit = None  # (飞行的tick数, 命中的那一段, 目标)
+    for number, segment in enumerate(segments):
+        for target in match.players:
+            if target.team != player.team and target.is_alive():
+                tick = segment_hit(segment, target.x, target.y, target_reach(target))
+                if tick is not None and (hit is None or tick < hit[0]):
+                    hit = (tick, number, target)
+        if hit is not None:
+            break
+    if hit is not None:
+        segments = segments[:hit[1] + 1]
+    dx, dy = camera.offset() if camera is not None else (0, 0)
+    color = TRAIL_COLORS.get(player.color, GRAY)
+    points = [(segments[0][0] + dx, segments[0][1] + dy)]
+    for number, (x, y, dir_x, dir_y, start, length) in enumerate(segments):
+        if hit is not None and number == hit[1]:
+            length = hit[0] * game_core.BULLET_SPEED - start  # 停在命中时子弹的位置
+        points.append((x + dir_x * length + dx, y + dir_y * length + dy))
+    rects = [pygame.draw.lines(surface, color, False, points, 1)]
+    if hit is not None:
+        rects.append(pygame.draw.circle(surface, color, (int(points[-1][0]), int(points[-1][1])), game_core.BULLET_RADIUS * 2, 2))
+    return rects
+
+
+def draw_explosions(effect_surface, explosions):
+    # 子弹消失时绘制一个圆形区域
+    return [pygame.draw.circle(effect_surface, color, (int(x), int(y)), 30) for x, y, color in explosions]
+
+
+def draw_wall_cell(surface, x, y, wall_type, color):
+    if wall_type == 1:
+        pygame.draw.rect(surface, GRAY, (x, y, WALL_SIZE, WALL_SIZE))
+        pygame.draw.rect(surface, DARK_GRAY, (x, y, WALL_SIZE, WALL_SIZE), 2)
+    elif wall_type == 2:
+        pygame.draw.rect(surface, color, (x, y, WALL_SIZE, WALL_SIZE))
+        pygame.draw.rect(surface, LIGHT_GRAY, (x, y, WALL_SIZE, WALL_SIZE), 2)
+    elif wall_type == 3:
+        pygame.draw.rect(surface, LIGHT_GRAY, (x, y, WALL_SIZE, WALL_SIZE))
+        pygame.draw.rect(surface, WHITE, (x, y, WALL_SIZE, WALL_SIZE), 2)
+
+
+# 墙体缓存层：生成地图时把所有墙画到一张Surface上，之后每帧只需一次blit。
+# 墙不会移动，只有墙2会在爆炸时变色，这些格子记录在grid.dirty中，绘制前单独重画
+class WallLayer:
+    COLORKEY = (255, 0, 255)  # 没有墙的地方用透明色键，比逐像素alpha的blit更快
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.surface = pygame.Surface((grid.cols * WALL_SIZE, grid.rows * WALL_SIZE))
+        self.surface.fill(self.COLORKEY)
+        self.surface.set_colorkey(self.COLORKEY)
+        for index, wall_type in enumerate(grid.types):
+            if wall_type:
+                self.paint_cell(index)
+        grid.dirty.clear()
+
+    def paint_cell(self, index):
+        row, col = divmod(index, self.grid.cols)
+        color = PAINT_COLORS[self.grid.colors[index]]
+        draw_wall_cell(self.surface, col * WALL_SIZE, row * WALL_SIZE, self.grid.types[index], color)
+
+    def update(self):
+        # 重画变色的墙2，返回这些格子的区域
+        rects = []
+        for index in self.grid.dirty:
+            self.paint_cell(index)
+            row, col = divmod(index, self.grid.cols)
+            rects.append(pygame.Rect(col * WALL_SIZE, row * WALL_SIZE, WALL_SIZE, WALL_SIZE))
+        self.grid.dirty.clear()
+        return rects
+
+    def draw(self, surface, camera=None):
+        # 有摄像机时只blit视野内的部分
+        self.update()
+        if camera is None:
+            surface.blit(self.surface, (0, 0))
+        else:
+            camera.blit_layer(surface, self.surface)
+
+
+# 脏矩形渲染：背景（白底、effect_surface和墙体层）合成在一张缓存Surface上，
+# 每帧只把上一帧前景元素覆盖过的区域和背景变化的区域从缓存中恢复，
+# 再画新的前景，最后只提交这些区域给pygame.display.update
+class DirtyRenderer:
+    def __init__(self, screen, wall_layer, effect_surface):
+        self.screen = screen
+        self.screen_rect = screen.get_rect()
+        self.background = pygame.Surface(screen.get_size())
+        self.reset(wall_layer, effect_surface)
+
+    def reset(self, wall_layer, effect_surface):
+        # 换地图时整体重建背景，下一帧整屏刷新
+        self.wall_layer = wall_layer
+        self.effect_surface = effect_surface
+        self.background.fill(WHITE)
+        self.background.blit(effect_surface, (0, 0))
+        self.background.blit(wall_layer.surface, (0, 0))
+        self.screen.blit(self.background, (0, 0))
+        self.previous = []  # 上一帧前景元素的区域
+        self.changed = []  # 背景有变化、尚未重新合成的区域
+        self.restored = []  # 本帧已从背景恢复的区域
+        self.full_redraw = True
+
+    def invalidate(self, rects):
+        # effect_surface上画了轨迹或爆炸，在下一次begin_frame时重新合成
+        self.changed.extend(rects)
+
+    def begin_frame(self):
+        # 重新合成变化的背景区域，并擦掉上一帧的前景
+        self.changed.extend(self.wall_layer.update())
+        for rect in self.changed:
+            self.background.fill(WHITE, rect)
+            self.background.blit(self.effect_surface, rect, rect)
+            self.background.blit(self.wall_layer.surface, rect, rect)
+        self.restored = [rect.clip(self.screen_rect) for rect in self.previous + self.changed]
+        self.changed = []
+        for rect in self.restored:
+            self.screen.blit(self.background, rect, rect)
+
+    def end_frame(self, rects):
+        # rects为本帧前景元素的区域
+        rects = [rect.clip(self.screen_rect) for rect in rects]
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.restored + rects)
+        self.previous = rects
+
+
+# 文字缓存：每种字号的字体只创建一次，渲染好的文字按(内容, 字号, 颜色)缓存，
+# 超出容量时淘汰最久没用过的；文字不变时每帧只需blit
+class TextCache:
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def render(self, text, size, color):
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = self.font(size).render(text, True, color)
+            if len(self.surfaces) > self.capacity:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+# 帧计时浮层：显示帧间隔、各阶段耗时的p50/p99和子弹数量，传入InputQueue时再加一行输入延迟。
+# 文字每refresh帧才更新一次，避免每帧重新统计和光栅化
+class ProfilerOverlay:
+    def __init__(self, profiler, refresh=15, font_size=20, inputs=None):
+        self.profiler = profiler
+        self.inputs = inputs
+        self.refresh = refresh
+        self.font_size = font_size
+        self.lines = []
+        self.frames = 0
+
+    def update_lines(self):
+        summary = self.profiler.summary()
+        frame_p50, frame_p99 = summary.pop("frame")
+        self.lines = [f"frame {frame_p50:.1f}/{frame_p99:.1f} ms (p50/p99)  bullets {self.profiler.last_bullets()}"]
+        for name, (p50, p99) in summary.items():
+            self.lines.append(f"{name:10} {p50:6.2f} {p99:6.2f}")
+        latency = self.inputs.latency_summary() if self.inputs is not None else None
+        if latency is not None:
+            self.lines.append(f"{'latency':10} {latency[0]:6.2f} {latency[1]:6.2f}")
+
+    def draw(self, surface, texts, x=10, y=90):
+        if self.frames % self.refresh == 0:
+            self.update_lines()
+        self.frames += 1
+        line_height = self.font_size - 4
+        rect = pygame.Rect(x, y, 260, line_height * len(self.lines) + 4)
+        surface.fill(LIGHT_GRAY, rect)
+        for i, line in enumerate(self.lines):
+            surface.blit(texts.render(line, self.font_size, BLACK), (x + 2, y + 2 + i * line_height))
+        return rect
+
+
+# 虚拟摇杆类
+class Joystick:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.radius = 30  # 减小摇杆的判定范围
+        self.inner_radius = 15
+        self.dx = 0
+        self.dy = 0
+
+    def draw(self, surface):
+        rect = pygame.draw.circle(surface, BLACK, (self.x, self.y), self.radius, 2)
+        rect.union_ip(pygame.draw.circle(surface, BLACK, (self.x + self.dx * self.radius, self.y + self.dy * self.radius), self.inner_radius))
+        return rect
+
+    def update(self, pos):
+        dx = pos[0] - self.x
+        dy = pos[1] - self.y
+        distance = math.hypot(dx, dy)
+        if distance > self.radius:
+            dx = dx * self.radius / distance
+            dy = dy * self.radius / distance
+        self.dx = dx / self.radius
+        self.dy = dy / self.radius
+
+
+# 触控按钮类
+class Button:
+    def __init__(self, x, y, width, height, text):
+        self.rect = pygame.Rect(x, y, width, height)
+        self.text = text
+
+    def draw(self, surface, texts):
+        pygame.draw.rect(surface, BLACK, self.rect, 2)
+        text_surface = texts.render(self.text, FONT_SIZE, BLACK)
+        text_rect = text_surface.get_rect(center=self.rect.center)
+        surface.blit(text_surface, text_rect)
+        return self.rect.union(text_rect)
+
+    def is_pressed(self, pos):
+        return self.rect.collidepoint(pos)
@@ -0,0 +1,183 @@
+# 对局录像：只保存地图种子和每个tick的玩家输入（转向、射击、防护罩按下/松开），
+# 回放时用同样的种子重新生成地图，按tick重放输入即可得到完全相同的对局。
+# 回放过程中定期保存状态快照，跳转时从最近的快照开始模拟，不用从第0个tick重来
+import copy
+import math
+import struct
+import zlib
+
+import game_core
+from game_core import ARENA_COLS, ARENA_ROWS, Match, seconds_to_ticks
+
+# 输入指令
+FIRE = 0
+SHIELD_ON = 1
+SHIELD_OFF = 2
+TURN_LEFT = 3  # 键盘左转一个tick
+TURN_RIGHT = 4  # 键盘右转一个tick
+SET_ANGLE = 5  # 摇杆直接设定朝向，附带一个角度（量化为一整圈的1/65536）
+
+# 文件头：魔数、版本、玩家人数、地图种子、地图列数和行数、结束时的tick、输入条数；
+# 之后是每名玩家的队伍编号（每人一个字节），最后是zlib压缩的输入流。
+# 每条输入记录：tick增量（变长整数）、一个字节（玩家下标 << 3 | 指令），SET_ANGLE再跟2字节的量化角度
+REPLAY_MAGIC = b"TRPL"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sBBqHHII")
+ANGLE = struct.Struct("<h")
+ANGLE_STEPS = 1 << 16  # 一整圈分成的份数
+
+
+def quantize_angle(angle):
+    # 角度 -> -32768~32767的整数，对应-pi~pi
+    return (round(angle * ANGLE_STEPS / (2 * math.pi)) + ANGLE_STEPS // 2) % ANGLE_STEPS - ANGLE_STEPS // 2
+
+
+def snap_angle(angle):
+    # 取最接近的可记录角度；实时对局和回放设定的朝向都经过这里，录像才能原样重放
+    return quantize_angle(angle) * 2 * math.pi / ANGLE_STEPS
+
+
+def apply_input(match, index, op, value=None):
+    # 实时对局和回放都通过这里执行输入，保证两边的效果一致；FIRE返回射出的子弹（没能射击时为None）
+    player = match.players[index]
+    if op == FIRE:
+        return match.fire(player)
+    elif op == SHIELD_ON:
+        player.activate_shield()
+    elif op == SHIELD_OFF:
+        player.deactivate_shield()
+    elif op == TURN_LEFT:
+        player.angle -= game_core.ROTATE_SPEED
+    elif op == TURN_RIGHT:
+        player.angle += game_core.ROTATE_SPEED
+    elif op == SET_ANGLE:
+        player.rotate(snap_angle(value))
+
+
+class InputRecorder:
+    def __init__(self, seed, arena=None, teams=None):
+        if seed is None:
+            # 没有种子的地图无法在回放时重新生成
+            raise ValueError("录像需要确定的地图种子")
+        self.seed = seed
+        self.arena = arena or (ARENA_COLS, ARENA_ROWS)  # 地图尺寸(列数, 行数)
+        self.teams = list(teams or (0, 1))  # 每名玩家的队伍编号
+        self.end_tick = 0
+        self.events = []  # (tick, 玩家下标, 指令, 参数)，tick为输入生效时match.tick的值
+
+    def send(self, match, index, op, value=None):
+        # 执行输入并记录
+        self.events.append((match.tick, index, op, value))
+        self.end_tick = match.tick
+        return apply_input(match, index, op, value)
+
+    def finish(self, match):
+        self.end_tick = match.tick
+
+    def to_bytes(self):
+        return encode_replay(self.seed, self.arena, self.teams, self.end_tick, self.events)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+
+def encode_replay(seed, arena, teams, end_tick, events):
+    # 每条输入：tick增量（变长整数）+ 一个字节（玩家下标 << 3 | 指令）+ SET_ANGLE的角度
+    body = bytearray()
+    last_tick = 0
+    for tick, index, op, value in events:
+        delta = tick - last_tick
+        last_tick = tick
+        while delta >= 0x80:
+            body.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        body.append(delta)
+        body.append(index << 3 | op)
+        if op == SET_ANGLE:
+            body += ANGLE.pack(quantize_angle(value))
+    header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, len(teams), seed, arena[0], arena[1],
+                                end_tick, len(events))
+    return header + bytes(teams) + zlib.compress(body, 9)
+
+
+class Replay:
+    def __init__(self, seed, arena, teams, end_tick, events):
+        self.seed = seed
+        self.arena = arena
+        self.teams = teams
+        self.end_tick = end_tick
+        self.events = events
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, players, seed, cols, rows, end_tick, count = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError("不是支持的录像格式")
+        teams = list(data[REPLAY_HEADER.size:REPLAY_HEADER.size + players])
+        body = zlib.decompress(data[REPLAY_HEADER.size + players:])
+        events = []
+        pos = 0
+        tick = 0
+        for _ in range(count):
+            delta = 0
+            shift = 0
+            while True:
+                byte = body[pos]
+                pos += 1
+                delta |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            tick += delta
+            code = body[pos]
+            pos += 1
+            value = None
+            if code & 0x7 == SET_ANGLE:
+                value = ANGLE.unpack_from(body, pos)[0] * 2 * math.pi / ANGLE_STEPS
+                pos += ANGLE.size
+            events.append((tick, code >> 3, code & 0x7, value))
+        return cls(seed, (cols, rows), teams, end_tick, events)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class ReplayPlayer:
+    def __init__(self, replay, snapshot_interval=seconds_to_ticks(10)):
+        self.replay = replay
+        self.snapshot_interval = snapshot_interval
+        self.inputs = {}  # tick -> 该tick开始前要执行的输入
+        for tick, index, op, value in replay.events:
+            self.inputs.setdefault(tick, []).append((index, op, value))
+        self.match = Match(seed=replay.seed, arena=replay.arena, teams=replay.teams)
+        self.snapshots = {0: copy.deepcopy(self.match)}  # tick -> 对局状态
+
+    def finished(self):
+        return self.match.tick >= self.replay.end_tick
+
+    def step(self):
+        match = self.match
+        for index, op, value in self.inputs.get(match.tick, ()):
+            apply_input(match, index, op, value)
+        match.step()
+        if match.tick % self.snapshot_interval == 0 and match.tick not in self.snapshots:
+            self.snapshots[match.tick] = copy.deepcopy(match)
+
+    def advance(self, ticks):
+        # 快进：连续推进最多ticks个tick，返回实际推进的数量
+        done = 0
+        while done < ticks and not self.finished():
+            self.step()
+            done += 1
+        return done
+
+    def seek(self, tick):
+        # 跳转到指定tick：从不晚于它的最近快照恢复，再模拟剩下的部分；返回新的match
+        tick = max(0, min(tick, self.replay.end_tick))
+        base = max(t for t in self.snapshots if t <= tick)
+        self.match = copy.deepcopy(self.snapshots[base])
+        self.advance(tick - base)
+        return self.match